@@ -15,6 +15,31 @@ LETTER_SPACING = 1  # Space between letters in pixels
 SENTENCE = """\n A a B b C c D d E e F f G g    H h I i J j K k L l M m N n \nO o P p Q  q R r S s T t U u V v    W w X x Y y Z z \n 0 1 2 3 4 5 6 7 8 9   \n Cat is God   \nCat creates world\nHumans were born from the blessing of cats."""
 
 # --- Create Image ---
+def line_height(font):
+    """Vertical distance between two text lines."""
+    bbox = font.getbbox("Hg")
+    return (bbox[3] - bbox[1]) + 10
+
+
+def draw_text(draw, text, font, x0=10, y0=10, letter_spacing=LETTER_SPACING, fill=TEXT_COLOR):
+    """Draw ``text`` (lines separated by "\n") one char at a time with
+    ``letter_spacing`` pixels between letters, starting at (x0, y0)."""
+    x, y = x0, y0
+    for line in text.split("\n"):
+        for char in line:
+            if char != " ":  # Skip spaces for spacing consistency
+                draw.text((x, y), char, font=font, fill=fill)
+            bbox = font.getbbox(char)  # Get bounding box of the character
+            x += (bbox[2] - bbox[0]) + letter_spacing
+        x = x0  # Reset x for the next line
+        y += line_height(font)  # Move to the next line with line spacing
+
+
+def text_width(line, font, letter_spacing=LETTER_SPACING):
+    """Width in pixels that draw_text() advances for one line."""
+    return sum(font.getbbox(c)[2] - font.getbbox(c)[0] + letter_spacing for c in line)
+
+
 def create_sentence_image():
     try:
         # Load font
@@ -27,18 +52,8 @@ def create_sentence_image():
     img = Image.new('RGB', (IMAGE_WIDTH, IMAGE_HEIGHT), color=BG_COLOR)
     draw = ImageDraw.Draw(img)
 
-    # Calculate text position
-    x, y = 10, 10  # Starting position
-
     # Draw text with pixel spacing between letters
-    for line in SENTENCE.split("\n"):
-        for char in line:
-            if char != " ":  # Skip spaces for spacing consistency
-                draw.text((x, y), char, font=font, fill=TEXT_COLOR)
-            bbox = font.getbbox(char)  # Get bounding box of the character
-            x += (bbox[2] - bbox[0]) + LETTER_SPACING
-        x = 10  # Reset x for the next line
-        y += (font.getbbox("Hg")[3] - font.getbbox("Hg")[1]) + 10  # Move to the next line with line spacing
+    draw_text(draw, SENTENCE, font)
 
     # Save image
     img.save(OUTPUT_IMAGE_PATH)
@@ -1,5 +1,12 @@
+import argparse
+import hashlib
+import json
 import os
 import string
+import sys
+from multiprocessing import Pool
+
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
 # --- 1. การตั้งค่า (Configuration) ---
@@ -11,165 +18,303 @@ OUTPUT_DIR_LOWER = "Lowercase_templates"
 OUTPUT_DIR_DIGITS = "Digits_templates"
 BG_COLOR = (255, 255, 255) # สีขาว
 TEXT_COLOR = (0, 0, 0)      # สีดำ
-FONT_SIZE = 50
+LARGE_CANVAS = 512          # วาดตัวอักษรบนภาพใหญ่ก่อนเพื่อให้ขอบคม แล้วค่อยย่อ
+# เปลี่ยนค่านี้เมื่อวิธีวาดเปลี่ยน เพื่อบังคับให้สร้าง template ใหม่ทั้งหมด
+RENDER_VERSION = 1
+MANIFEST_NAME = ".template_manifest.json"
 
-# --- 2. ค้นหาตำแหน่งฟอนต์ (สำหรับ Windows โดยเฉพาะ) ---
+CHAR_SETS = {
+    "upper": string.ascii_uppercase,
+    "lower": string.ascii_lowercase,
+    "digits": string.digits,
+    "letters": string.ascii_letters,
+    "all": string.ascii_letters + string.digits,
+}
+
+# ฟอนต์ของแต่ละ worker process (โหลดครั้งเดียวต่อไฟล์ฟอนต์)
+_fonts = {}
 
-# เราจะใช้ Environment Variable 'WINDIR' (ซึ่งปกติคือ C:\Windows)
-# เพื่อสร้าง path ไปยังโฟลเดอร์ Fonts
-font_path = ""
-windir = os.environ.get('WINDIR') # ดึงค่า (เช่น C:\Windows)
 
-if windir and os.path.exists(windir):
-    # สร้าง path ที่ถูกต้องโดยอัตโนมัติ (เช่น C:\Windows\Fonts\calibri.ttf)
-    font_path = os.path.join(windir, 'Fonts', 'BKANT.TTF')
-else:
+# --- 2. ค้นหาตำแหน่งฟอนต์ (สำหรับ Windows โดยเฉพาะ) ---
+
+def default_font_path():
+    """BKANT.TTF from the Windows font folder ('WINDIR', normally C:\\Windows)."""
+    windir = os.environ.get('WINDIR')
+    if windir and os.path.exists(windir):
+        return os.path.join(windir, 'Fonts', 'BKANT.TTF')
     # กรณีฉุกเฉิน หากหา WINDIR ไม่เจอ
-    print("ไม่พบตัวแปร WINDIR ของระบบ, ใช้ตำแหน่งมาตรฐาน C:/Windows/Fonts/THSarabunNew.ttf")
-    font_path = "C:/Windows/Fonts/Calibri.ttf"
-
-print(f"กำลังใช้ฟอนต์จาก: {font_path}")
-
-# --- 3. ตรวจสอบฟอนต์และสร้างโฟลเดอร์ ---
-
-custom = input("หากต้องการระบุฟอนต์เอง ให้พิมพ์ path ไปยังไฟล์ .ttf แล้วกด Enter (หรือเว้นว่างเพื่อใช้ค่าเดิม): ").strip()
-if custom:
-    font_path = custom
-
-try:
-    # โหลดฟอนต์
-    font = ImageFont.truetype(font_path, FONT_SIZE)
-except IOError:
-    print(f"!!! ข้อผิดพลาด: ไม่พบไฟล์ฟอนต์ที่ '{font_path}'")
-    print("โปรดตรวจสอบ path ฟอนต์หรือคัดลอกไฟล์ .ttf มาวาง และลองใหม่อีกครั้ง")
-    exit() # จบการทำงานถ้าไม่เจอฟอนต์
-
-# สร้างโฟลเดอร์สำหรับเก็บผลลัพธ์ถ้ายังไม่มี
-os.makedirs(OUTPUT_DIR_UPPER, exist_ok=True)
-os.makedirs(OUTPUT_DIR_LOWER, exist_ok=True)
-os.makedirs(OUTPUT_DIR_DIGITS, exist_ok=True)
-
-print("กำลังสร้าง template... บันทึกลงโฟลเดอร์ตามประเภทตัวอักษร")
-
-# --- 4. เลือกประเภทตัวอักษร ---
-print("เลือกประเภทตัวอักษรที่ต้องการสร้าง:")
-print("1: ตัวพิมพ์ใหญ่ (A-Z)")
-print("2: ตัวพิมพ์เล็ก (a-z)")
-print("3: ตัวเลข (0-9)")
-print("4: ตัวพิมพ์ใหญ่และพิมพ์เล็ก (A-Z, a-z)")
-print("5: ทั้งหมด (A-Z, a-z, 0-9)")
-print("6: ระบุเอง (พิมพ์ตัวอักษรที่ต้องการ เช่น ABCabc123)")
-
-choice = input("กรุณาเลือก (1/2/3/4/5): ").strip()
-
-if choice == "1":
-    characters = string.ascii_uppercase
-elif choice == "2":
-    characters = string.ascii_lowercase
-elif choice == "3":
-    characters = string.digits
-elif choice == "4":
-    characters = string.ascii_letters
-elif choice == "5":
-    characters = string.ascii_letters + string.digits
-elif choice == "6":
-    custom_chars = input("พิมพ์ตัวอักษรที่ต้องการสร้าง (เช่น ABCabc123 หรือ ใส่คั่นด้วยช่องว่าง/คอมม่า): ").strip()
-    # ลบช่องว่างและคอมม่า ถ้าว่างให้ fallback เป็นค่าเริ่มต้นทั้งหมด
-    if custom_chars:
-        # Remove common separators (spaces, commas)
-        cleaned = custom_chars.replace(',', '').replace(' ', '')
-        if cleaned:
-            characters = cleaned
-        else:
-            print("ไม่พบตัวอักษรที่ถูกต้องในอินพุต, ใช้ค่าเริ่มต้นทั้งหมด")
-            characters = string.ascii_letters + string.digits
-    else:
-        print("ไม่ได้ป้อนตัวอักษร, ใช้ค่าเริ่มต้นทั้งหมด")
-        characters = string.ascii_letters + string.digits
-else:
-    print("ตัวเลือกไม่ถูกต้อง! ใช้ค่าเริ่มต้นคือทั้งหมด (A-Z, a-z, 0-9)")
-    characters = string.ascii_letters + string.digits
+    return "C:/Windows/Fonts/Calibri.ttf"
+
+
+def parse_chars(specs):
+    """Char set names (see CHAR_SETS) or literal chars -> unique chars in order.
+    A literal spec is not separated: every char of it is a template (",.;"
+    gives comma, period and semicolon), only whitespace is skipped since it
+    has no glyph."""
+    chars = []
+    for spec in specs:
+        chars.extend(CHAR_SETS.get(spec, (c for c in spec if not c.isspace())))
+    return list(dict.fromkeys(chars))
 
-# --- 5. วนลูปสร้างตัวอักษร ---
 
-def render_and_save(char, out_dir):
+def parse_size(spec):
+    """"30" -> (30, 30), "24x32" -> (24, 32)."""
+    w, _, h = spec.lower().partition('x')
+    return int(w), int(h or w)
+
+
+def output_dir(char):
+    """Template folder of a char (same split as the bundled templates)."""
+    if char.isdigit():
+        return OUTPUT_DIR_DIGITS
+    if char.isalpha() and char.isupper():
+        return OUTPUT_DIR_UPPER
+    if char.isalpha() and char.islower():
+        return OUTPUT_DIR_LOWER
+    return OUTPUT_DIR_DIGITS
+
+
+def template_name(char, variant=None):
+    """File name (without extension) of a template, see template_bank.template_char()."""
     # Sanitize filename: keep alnum as-is, otherwise use Unicode codepoint
-    if char.isalnum():
-        filename = f"{char}.png"
-    else:
-        filename = f"u{ord(char):04X}.png"
-    filepath = os.path.join(out_dir, filename)
+    name = char if char.isalnum() else f"u{ord(char):04X}"
+    return f"{name}@{variant}" if variant else name
 
-    # Padding requested by user: 1 px
-    
-    padding = 0
 
-    # Render glyph on a large temporary grayscale canvas to get clean mask
-    # Choose a sufficiently large size to preserve detail
-    large_canvas = 512
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def render_key(font_hash, char, size):
+    """Identifies one rendered template; unchanged key = nothing to redo."""
+    return hashlib.sha256(
+        f"v{RENDER_VERSION}|{font_hash}|{ord(char)}|{size[0]}x{size[1]}".encode()).hexdigest()
 
-    # Try to create a large font; fall back to decreasing sizes if necessary
-    large_font_size = min(large_canvas - 4, 512)
-    tmp_font = None
-    while large_font_size > 8:
-        try:
-            tmp_font = ImageFont.truetype(font_path, large_font_size)
-            break
-        except Exception:
-            large_font_size = large_font_size // 2
 
-    if tmp_font is None:
-        # Fallback: use the previously loaded font (smaller)
-        tmp_font = font
+# --- 3. วาดตัวอักษร ---
 
-    mask_img = Image.new('L', (large_canvas, large_canvas), 0)
+def load_font(font_path):
+    """Large font used to rasterize glyphs; cached so every font file is
+    opened once per process."""
+    font = _fonts.get(font_path)
+    if font is None:
+        # Try to create a large font; fall back to decreasing sizes if necessary
+        size = LARGE_CANVAS - 4
+        while size > 8:
+            try:
+                font = ImageFont.truetype(font_path, size)
+                break
+            except Exception:
+                size = size // 2
+        if font is None:
+            raise IOError(f"cannot load font '{font_path}'")
+        _fonts[font_path] = font
+    return font
+
+
+def render_template(font, char, width=IMG_WIDTH, height=IMG_HEIGHT):
+    """Black glyph centered on a white (width, height) RGB image, scaled to
+    fit while keeping its aspect ratio."""
+    mask_img = Image.new('L', (LARGE_CANVAS, LARGE_CANVAS), 0)
     draw_mask = ImageDraw.Draw(mask_img)
     # Draw the glyph white on black background, centered in the large canvas
-    draw_mask.text((large_canvas / 2, large_canvas / 2), char, font=tmp_font, fill=255, anchor='mm')
+    draw_mask.text((LARGE_CANVAS / 2, LARGE_CANVAS / 2), char, font=font, fill=255, anchor='mm')
 
+    out = Image.new('RGB', (width, height), BG_COLOR)
     # Get bounding box of the glyph mask
     bbox = mask_img.getbbox()
     if not bbox:
-        # Empty glyph? create a blank 30x30 image
-        out = Image.new('RGB', (IMG_WIDTH, IMG_HEIGHT), BG_COLOR)
-        out.save(filepath)
-        return
+        # Empty glyph? keep the blank image
+        return out
 
     glyph = mask_img.crop(bbox)
     gw, gh = glyph.size
 
-    # Compute scale to fit target minus padding, preserving aspect ratio
-    target_w = IMG_WIDTH - 2 * padding
-    target_h = IMG_HEIGHT - 2 * padding
-    scale = min(target_w / gw, target_h / gh)
-    if scale <= 0:
-        scale = 1.0
-
+    # Compute scale to fit target, preserving aspect ratio
+    scale = min(width / gw, height / gh)
     new_w = max(1, int(round(gw * scale)))
     new_h = max(1, int(round(gh * scale)))
 
     # Resize glyph mask with high-quality resampling
     glyph_resized = glyph.resize((new_w, new_h), resample=Image.LANCZOS)
 
-    # Prepare final RGB image and paste the glyph (using mask) centered
-    out = Image.new('RGB', (IMG_WIDTH, IMG_HEIGHT), BG_COLOR)
-    # Create a colored glyph image (black text) same size as glyph_resized
+    # Paste a black glyph (using the mask) centered
     colored = Image.new('RGB', (new_w, new_h), TEXT_COLOR)
-    # Compute top-left coordinate to center the glyph
-    left = (IMG_WIDTH - new_w) // 2
-    top = (IMG_HEIGHT - new_h) // 2
+    left = (width - new_w) // 2
+    top = (height - new_h) // 2
     out.paste(colored, (left, top), glyph_resized)
+    return out
 
-    out.save(filepath)
 
-for char in characters:
-    if char.isdigit():
-        render_and_save(char, OUTPUT_DIR_DIGITS)
-    elif char.isalpha() and char.isupper():
-        render_and_save(char, OUTPUT_DIR_UPPER)
-    elif char.isalpha() and char.islower():
-        render_and_save(char, OUTPUT_DIR_LOWER)
+def _render_job(job):
+    """Pool task: render one template, save it as PNG if ``path`` is set,
+    return (name, grayscale array or None)."""
+    name, font_path, char, size, path = job
+    img = render_template(load_font(font_path), char, *size)
+    if path:
+        img.save(path)
+        return name, None
+    return name, np.array(img.convert('L'))
+
+
+def run_jobs(jobs, workers=None):
+    """Render ``jobs`` with a process pool (1 worker = in this process)."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs) or 1))
+    if workers == 1:
+        return [_render_job(job) for job in jobs]
+    # one chunk per worker and font keeps the number of font loads low
+    chunksize = max(1, len(jobs) // (4 * workers))
+    with Pool(workers) as pool:
+        return list(pool.imap_unordered(_render_job, jobs, chunksize=chunksize))
+
+
+# --- 4. สร้างรายการงาน ---
+
+def plan(fonts, chars, sizes, root="."):
+    """One entry per (font, size, char): dict with name, char, size, font,
+    key and the PNG path. With more than one font/size every template gets
+    a ``@<font>-<size>`` variant suffix so they can share the folders."""
+    variants = len(fonts) * len(sizes) > 1
+    entries = []
+    for font_path in fonts:
+        font_hash = file_hash(font_path)
+        stem = os.path.splitext(os.path.basename(font_path))[0]
+        for size in sizes:
+            variant = f"{stem}-{size[0]}x{size[1]}" if variants else None
+            for char in chars:
+                name = template_name(char, variant)
+                entries.append({
+                    "name": name, "char": char, "size": size, "font": font_path,
+                    "key": render_key(font_hash, char, size),
+                    "path": os.path.join(root, output_dir(char), name + ".png")})
+    return entries
+
+
+def _load_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_pngs(entries, root=".", workers=None, force=False):
+    """Render the templates of ``entries`` that changed into PNG files.
+    Returns (rendered, skipped)."""
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    manifest = {} if force else _load_json(manifest_path)
+    todo = [e for e in entries
+            if manifest.get(e["path"]) != e["key"] or not os.path.exists(e["path"])]
+
+    for e in todo:
+        os.makedirs(os.path.dirname(e["path"]), exist_ok=True)
+    run_jobs([(e["name"], e["font"], e["char"], e["size"], e["path"]) for e in todo], workers)
+
+    manifest.update({e["path"]: e["key"] for e in todo})
+    tmp_path = f"{manifest_path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    return len(todo), len(entries) - len(todo)
+
+
+def write_bank(entries, bank_path, width, height, workers=None, force=False):
+    """Render straight into a compiled template bank (see template_cache.py),
+    reusing the templates of an existing bank whose key did not change.
+    Returns (rendered, skipped)."""
+    from ocr_engine import prepare_template
+    from template_bank import TemplateBank
+    from template_cache import STANDALONE_PREFIX, _mmap_npz, save_compiled
+
+    old = {}
+    if os.path.exists(bank_path) and not force:
+        try:
+            arrays = _mmap_npz(bank_path)
+            if arrays["images"].shape[1:] == (height, width) and "render_keys" in arrays:
+                old = {str(k): np.array(img) for k, img in
+                       zip(arrays["render_keys"], arrays["images"])}
+        except Exception as e:
+            print(f"คำเตือน: ไม่สามารถอ่าน {bank_path} ({e}) จะสร้างใหม่ทั้งหมด")
+
+    todo = [e for e in entries if e["key"] not in old]
+    rendered = dict(run_jobs([(e["name"], e["font"], e["char"], e["size"], None)
+                              for e in todo], workers))
+    templates = {}
+    for e in entries:
+        if e["key"] in old:
+            templates[e["name"]] = old[e["key"]]
+        else:
+            templates[e["name"]] = prepare_template(rendered[e["name"]], width, height)
+
+    keys = [e["key"] for e in entries]
+    source = hashlib.sha256("\0".join(keys).encode()).hexdigest()
+    save_compiled(TemplateBank.from_dict(templates), bank_path, STANDALONE_PREFIX + source,
+                  render_keys=np.array(keys, dtype=str))
+    return len(todo), len(entries) - len(todo)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render character templates from font files (incremental, parallel)")
+    parser.add_argument('--font', '-f', action='append', dest='fonts',
+                        help='.ttf/.otf font file (repeatable, default: BKANT.TTF from the '
+                             'Windows font folder)')
+    parser.add_argument('--chars', '-c', action='append',
+                        help=f'Char set ({", ".join(CHAR_SETS)}) or literal chars without '
+                             'separators such as ABCabc123 or ",.;" (repeatable, default: all)')
+    parser.add_argument('--size', '-s', action='append', dest='sizes',
+                        help=f'Template size N or WxH (repeatable, default: '
+                             f'{IMG_WIDTH}x{IMG_HEIGHT})')
+    parser.add_argument('--output-root', '-o', default=".",
+                        help='Folder that holds the *_templates folders (default: .)')
+    parser.add_argument('--bank', metavar='NPZ',
+                        help='Write a compiled template bank instead of PNG files '
+                             '(use with OCR_ComputerVision.py --template-cache NPZ)')
+    parser.add_argument('--bank-size', default=f"{IMG_WIDTH}x{IMG_HEIGHT}",
+                        help='--bank: matching size of the templates in the bank')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Render processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true',
+                        help='Render everything even if unchanged')
+    args = parser.parse_args()
+
+    fonts = args.fonts or [default_font_path()]
+    for font_path in fonts:
+        try:
+            load_font(font_path)
+        except IOError:
+            print(f"!!! ข้อผิดพลาด: ไม่พบไฟล์ฟอนต์ที่ '{font_path}'")
+            print("โปรดตรวจสอบ path ฟอนต์ (--font) และลองใหม่อีกครั้ง")
+            return 1
+    chars = parse_chars(args.chars or ["all"])
+    if not chars:
+        print("ไม่พบตัวอักษรที่ถูกต้องใน --chars")
+        return 1
+    try:
+        sizes = [parse_size(s) for s in args.sizes or [f"{IMG_WIDTH}x{IMG_HEIGHT}"]]
+        bank_size = parse_size(args.bank_size)
+    except ValueError as e:
+        print(f"ขนาดไม่ถูกต้อง: {e}")
+        return 1
+
+    print(f"กำลังสร้าง template: {len(fonts)} ฟอนต์ x {len(sizes)} ขนาด x {len(chars)} ตัวอักษร")
+    entries = plan(fonts, chars, sizes, args.output_root)
+    if args.bank:
+        rendered, skipped = write_bank(entries, args.bank, *bank_size, args.workers, args.force)
+        where = args.bank
     else:
-        render_and_save(char, OUTPUT_DIR_DIGITS)
+        rendered, skipped = write_pngs(entries, args.output_root, args.workers, args.force)
+        where = args.output_root
+    print(f"สร้าง template ตัวอักษรเสร็จสิ้น! สร้างใหม่ {rendered} ไฟล์, "
+          f"ไม่เปลี่ยนแปลง {skipped} ไฟล์ ({where})")
+    return 0
+
 
-print(f"สร้าง template ตัวอักษรเสร็จสิ้น! (ทั้งหมด {len(characters)} ไฟล์)")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,330 +1,374 @@
 import cv2
-import numpy as np
-import os
-import string
 import argparse
-import time
+import sys
 
-# --- การตั้งค่า ---
-# ถ้ามีเทมเพลตแยกโฟลเดอร์ตามชนิด ให้ใส่ชื่อโฟลเดอร์เหล่านั้นไว้ในลิสต์นี้
-TEMPLATE_DIRS = ["Digits_templates", "Lowercase_templates", "Uppercase_templates"]
-TEST_IMAGE_PATH = "sentence_image.png"  # สร้างไฟล์นี้เพื่อทดสอบ
-TEMPLATE_WIDTH = 30
-TEMPLATE_HEIGHT = 30
-MATCH_THRESHOLD = 0.6  # ค่าความมั่นใจ (0.0 - 1.0) ยิ่งสูงยิ่งเข้มงวด — ปรับลดเล็กน้อยเมื่อใช้คะแนนเฉลี่ย
-
-# ---- Command line options ----
-parser = argparse.ArgumentParser(description="Simple template-matching OCR")
-parser.add_argument('--no-gui', action='store_true', help='Do not show OpenCV windows')
-parser.add_argument('--output-file', '-o', help='Write OCR result to a file')
-args = parser.parse_args()
-
-def load_templates(template_dirs):
-    """โหลดเทมเพลตทั้งหมดจากโฟลเดอร์/หลายโฟลเดอร์มาเก็บใน Dictionary
-
-    template_dirs can be a string (single folder) or a list of folders.
-    Files with extensions .png/.jpg/.jpeg/.bmp/.tif/.tiff will be loaded.
-    Each template is converted to binary (inverted so foreground = 255) and
-    resized to (TEMPLATE_WIDTH, TEMPLATE_HEIGHT) for matching.
-    """
-    templates = {}
-
-    # allow passing a single folder as string
-    if isinstance(template_dirs, str):
-        template_dirs = [template_dirs]
-
-    print("กำลังโหลดเทมเพลต...")
-    for tdir in template_dirs:
-        if not os.path.isdir(tdir):
-            print(f"คำเตือน: ไม่พบโฟลเดอร์เทมเพลตที่ {tdir}")
-            continue
-
-        for fname in os.listdir(tdir):
-            name, ext = os.path.splitext(fname)
-            if ext.lower() not in ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff'):
-                continue
-
-            path = os.path.join(tdir, fname)
-            template_img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-            if template_img is None:
-                print(f"คำเตือน: ไม่สามารถโหลดเทมเพลตที่ {path}")
-                continue
-
-            # Normalize: binarize and invert so foreground is white (255) like ROI
-            try:
-                _, template_bin = cv2.threshold(template_img, 0, 255,
-                                                cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
-            except Exception:
-                # fallback: simple threshold
-                _, template_bin = cv2.threshold(template_img, 127, 255, cv2.THRESH_BINARY)
-
-            # Resize to match matcher size
-            try:
-                template_resized = cv2.resize(template_bin, (TEMPLATE_WIDTH, TEMPLATE_HEIGHT))
-            except Exception as e:
-                print(f"คำเตือน: ไม่สามารถปรับขนาดเทมเพลต {path}: {e}")
-                continue
-
-            templates[name] = template_resized
-
-    print(f"โหลดเทมเพลตสำเร็จ {len(templates)} ตัว จาก {template_dirs}")
-    return templates
-
-def sort_contours(contours):
-    """
-    จัดเรียง Contours แบบรองรับหลายบรรทัด: แบ่งเป็น "rows" ตามค่า y-center
-    แล้วเรียงแต่ละแถวจากซ้ายไปขวา
-    """
-    if not contours:
-        return contours
-
-    # เก็บ bounding boxes และ y-centers
-    boxes = [cv2.boundingRect(c) for c in contours]
-    centers_y = [y + h / 2 for (x, y, w, h) in boxes]
-
-    # จัดกลุ่มเป็นแถว โดยใช้ tolerance เท่ากับค่าเฉลี่ยความสูง
-    avg_h = np.mean([h for (x, y, w, h) in boxes]) if boxes else 0
-    rows = []  # each row is list of (contour, box)
-
-    for c, b, cy in zip(contours, boxes, centers_y):
-        placed = False
-        for row in rows:
-            # compare with first box in the row
-            _, ry, _, rh = row[0][1]
-            if abs(cy - (ry + rh / 2)) <= max(10, avg_h * 0.5):
-                row.append((c, b))
-                placed = True
-                break
-        if not placed:
-            rows.append([(c, b)])
-
-    # sort rows by y, then within each row sort by x
-    rows_sorted = sorted(rows, key=lambda r: r[0][1][1])
-    sorted_contours = []
-    for row in rows_sorted:
-        row_sorted = sorted(row, key=lambda item: item[1][0])
-        sorted_contours.extend([item[0] for item in row_sorted])
-
-    return sorted_contours
-
-
-def prepare_roi_for_matching(roi, width=TEMPLATE_WIDTH, height=TEMPLATE_HEIGHT):
-    """Resize ROI to template size while preserving aspect ratio by padding.
-
-    Input roi should be binary with foreground=255.
-    """
-    h, w = roi.shape[:2]
-    if h == 0 or w == 0:
-        return np.zeros((height, width), dtype=np.uint8)
-
-    # find bounding non-zero area to crop tight (optional)
-    ys, xs = np.where(roi > 0)
-    if len(xs) and len(ys):
-        x1, x2 = xs.min(), xs.max()
-        y1, y2 = ys.min(), ys.max()
-        roi = roi[y1:y2+1, x1:x2+1]
-        h, w = roi.shape[:2]
-
-    # compute scaling while maintaining aspect ratio
-    scale = min(width / w, height / h)
-    new_w = max(1, int(w * scale))
-    new_h = max(1, int(h * scale))
-    resized = cv2.resize(roi, (new_w, new_h), interpolation=cv2.INTER_AREA)
-
-    # create padded image
-    canvas = np.zeros((height, width), dtype=np.uint8)
-    x_off = (width - new_w) // 2
-    y_off = (height - new_h) // 2
-    canvas[y_off:y_off+new_h, x_off:x_off+new_w] = resized
-
-    return canvas
-
-
-def group_chars_into_lines(detected_list):
-    """Group detected characters into rows based on y-center (baseline) and
-    sort each row left-to-right.
-
-    detected_list: list of tuples (x, y, w, h, char)
-    Returns list of strings (one string per row), ordered top-to-bottom.
-    """
-    if not detected_list:
-        return []
-
-    # compute y-centers and average height to choose a tolerance
-    centers_y = [y + h / 2 for (x, y, w, h, c) in detected_list]
-    avg_h = np.mean([h for (x, y, w, h, c) in detected_list]) if detected_list else 0
-
-    rows = []  # each row is list of items (x,y,w,h,char)
-    for item, cy in zip(detected_list, centers_y):
-        placed = False
-        for row in rows:
-            ry = row[0][1]
-            rh = row[0][3]
-            row_cy = ry + rh / 2
-            # tolerance: either a few pixels or a fraction of avg height
-            if abs(cy - row_cy) <= max(10, avg_h * 0.5):
-                row.append(item)
-                placed = True
-                break
-        if not placed:
-            rows.append([item])
-
-    # sort rows by their y coordinate (top to bottom)
-    rows_sorted = sorted(rows, key=lambda r: r[0][1])
-
-    # within each row, sort by x (left to right) and join chars
-    final_rows = []
-    for row in rows_sorted:
-        row_sorted = sorted(row, key=lambda it: it[0])
-        final_rows.append(''.join([it[4] for it in row_sorted]))
-
-    return final_rows
-
-# --- 1. โหลดเทมเพลต (ทำครั้งเดียว) ---
-templates = load_templates(TEMPLATE_DIRS)
-
-# --- 2. โหลดและประมวลผลภาพทดสอบ ---
-image = cv2.imread(TEST_IMAGE_PATH)
-if image is None:
-    print(f"Error: ไม่พบไฟล์ทดสอบ '{TEST_IMAGE_PATH}'")
-    print("กรุณาสร้างไฟล์ภาพ ที่มีข้อความด้วยฟอนต์ที่ตรงกับเทมเพลตก่อน")
-    exit()
-
-# สร้างภาพสำหรับวาดผลลัพธ์
-output_image = image.copy()
-
-# แปลงเป็น Grayscale และ Binarization (ขาว-ดำ)
-gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-# ใช้ THRESH_BINARY_INV เพื่อให้ตัวอักษรเป็น "สีขาว" (255)
-# และพื้นหลังเป็น "สีดำ" (0) เหมือนกับเทมเพลต
-# THRESH_OTSU จะหาค่า threshold ที่เหมาะสมให้เราอัตโนมัติ
-thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
-
-# --- 3. ค้นหาตัวอักษร (Segmentation) ---
-# ค้นหา Contours (รูปร่างของตัวอักษร)
-contours, hierarchy = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-# จัดเรียง contours จากซ้ายไปขวา
-if contours:
-    contours = sort_contours(contours)
-
-print(f"พบ {len(contours)} contours (ตัวอักษรที่อาจเป็นไปได้)")
-
-detected_string = ""
-detected_chars_with_pos = []
-bad_roi_saved = False  # save only the first failing ROI for debugging
-
-# --- 4. วนลูปเพื่อเปรียบเทียบ (Matching) ---
-for cnt in contours:
-    # หากรอบสี่เหลี่ยมของตัวอักษร
-    x, y, w, h = cv2.boundingRect(cnt)
-
-    # กรอง contours ที่เล็กเกินไป (อาจเป็นจุดรบกวน)
-    if w < 2 or h < 10:
-        continue
-
-    # ตัดภาพเฉพาะส่วนของตัวอักษร (Region of Interest - ROI)
-    roi = thresh[y:y+h, x:x+w]
-    
-    # เตรียม ROI โดยรักษาสัดส่วนและเติมขอบก่อน matching
-    resized_roi = prepare_roi_for_matching(roi, TEMPLATE_WIDTH, TEMPLATE_HEIGHT)
-
-    # เตรียมตัวแปรสำหรับเก็บค่าที่ Match ที่สุด
-    best_match_score = -1
-    best_match_char = "?"
-
-    # --- 5. หัวใจหลัก: Template Matching ---
-    # วนลูปเปรียบเทียบ ROI กับเทมเพลตทุกตัว
-    for (char, template_img) in templates.items():
-        # Use two match methods and average for robustness
-        try:
-            res1 = cv2.matchTemplate(resized_roi, template_img, cv2.TM_CCOEFF_NORMED)
-            _, max1, _, _ = cv2.minMaxLoc(res1)
-        except Exception:
-            max1 = -1
+from binarization import BINARIZERS
+from debug_writer import DEBUG_RATE, DEBUG_SAMPLE
+from metrics import Metrics, timed
+from pipeline import QUEUE_SIZE, READERS, PagePipeline, run_pipeline
+from segmentation import SEGMENTERS
+from streaming import BAND_HEIGHT, BAND_OVERLAP, open_page, recognize_stream
 
-        try:
-            res2 = cv2.matchTemplate(resized_roi, template_img, cv2.TM_CCORR_NORMED)
-            _, max2, _, _ = cv2.minMaxLoc(res2)
-        except Exception:
-            max2 = -1
+# load_templates, sort_contours ... are re-exported for code that imported them from here
+from ocr_engine import (OCREngine, default_template_dirs, TEMPLATE_WIDTH, TEMPLATE_HEIGHT,
+                        MATCH_THRESHOLD, load_templates, sort_contours,
+                        prepare_roi_for_matching, group_chars_into_lines, parse_scales)
 
-        # combine scores (simple average) — both are in similar normalized ranges
-        score = (max1 + max2) / 2.0
+# --- การตั้งค่า ---
+TEST_IMAGE_PATH = "sentence_image.png"  # สร้างไฟล์นี้เพื่อทดสอบ
 
-        if score > best_match_score:
-            best_match_score = score
-            best_match_char = char
 
-    # --- 6. แสดงผลลัพธ์ ---
-    # ถ้าคะแนนดีกว่าเกณฑ์ที่เราตั้งไว้ (เช่น 0.7)
-    if best_match_score > MATCH_THRESHOLD:
-        # เก็บผลลัพธ์ (พร้อมตำแหน่ง x, y, w, h, char) — เพื่อให้สามารถจัดกลุ่มตาม baseline ได้
-        detected_chars_with_pos.append((x, y, w, h, best_match_char))
-        
-        # วาดกรอบและข้อความลงบนภาพ Output
-        cv2.rectangle(output_image, (x, y), (x + w, y + h), (0, 255, 0), 2)
-        cv2.putText(output_image, best_match_char, (x, y - 10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 0), 2)
-    else:
-        # ถ้าคะแนนต่ำไป ให้แสดงเป็น '?'
-        cv2.rectangle(output_image, (x, y), (x + w, y + h), (0, 0, 255), 2)
-        cv2.putText(output_image, '', (x, y - 10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-        # บันทึกภาพ ROI ที่จับคู่ไม่ผ่านครั้งแรกเพื่อตรวจสอบ (ต้นฉบับ + resized + template)
-        if not bad_roi_saved:
-            try:
-                ts = int(time.time())
-                fname_roi = f"bad_roi_{ts}.png"
-                fname_resized = f"bad_roi_resized_{ts}.png"
-                cv2.imwrite(fname_roi, roi)
-                cv2.imwrite(fname_resized, resized_roi)
-                # ถ้ามี template ที่ได้คะแนนสูงสุด ให้บันทึกเทมเพลตด้วย
-                if best_match_char in templates:
-                    try:
-                        cv2.imwrite(f"bad_roi_template_{ts}.png", templates[best_match_char])
-                    except Exception:
-                        pass
-
-                print(f"บันทึก ROI ที่จับคู่ไม่ผ่านไว้ที่: {fname_roi}, {fname_resized}")
-                print(f"bbox=(x,y,w,h)={(x,y,w,h)} score={best_match_score:.3f} best_match_char={best_match_char}")
-                bad_roi_saved = True
-            except Exception as e:
-                print(f"ไม่สามารถบันทึก ROI ผิดพลาด: {e}")
-
-
-# จัดกลุ่มตัวอักษรตาม baseline (แถว) และเรียงภายในแถวจากซ้ายไปขวา
-rows = group_chars_into_lines(detected_chars_with_pos)
-
-print("-" * 30)
-print("Detected (grouped by baseline):")
-for r in rows:
-    print(r)
-print("-" * 30)
-
-# ผลลัพธ์แบบเรียบ (ต่อกันเป็นสตริงเดียว) สำหรับการส่งออกหรือการใช้งานต่อ
-final_string = ''.join(rows)
-
-# ส่งออกแบบเรียบตรงไปยัง stdout (เหมาะสำหรับการจับผลลัพธ์จาก terminal)
-print(final_string)
-
-# ถ้าผู้ใช้ต้องการบันทึกผลลงไฟล์
-if args.output_file:
+def engine_options(args):
+    """OCREngine keyword arguments from the command line options."""
+    return {"template_cache": args.template_cache,
+            "prune_k": args.prune_k,
+            "prune_check": args.prune_check,
+            "binarizer": args.binarize,
+            "segmenter": args.segmentation,
+            "merge_parts": args.merge_parts,
+            "glyph_cache_size": args.glyph_cache,
+            "glyph_cache_file": args.glyph_cache_file,
+            "glyph_cache_perceptual": args.glyph_cache_perceptual,
+            "metrics": bool(args.metrics),
+            "debug_dir": args.debug_dir,
+            "debug_sample": args.debug_sample,
+            "debug_rate": args.debug_rate,
+            "scales": args.scales,
+            "top_k": args.top_k,
+            "split_touching": args.split_touching}
+
+
+def save_metrics(metrics, path):
+    """พิมพ์เวลาของแต่ละขั้นตอนแล้วบันทึก metrics (.prom = Prometheus, อื่น ๆ = JSON)"""
+    if metrics is None or not path:
+        return
+    print(metrics.report(), file=sys.stderr)
     try:
-        with open(args.output_file, 'w', encoding='utf-8') as f:
-            f.write(final_string)
-        print(f"บันทึกผล OCR ลงไฟล์: {args.output_file}")
+        metrics.save(path)
+        print(f"บันทึก metrics ลงไฟล์: {path}", file=sys.stderr)
     except Exception as e:
-        print(f"ไม่สามารถเขียนไฟล์ {args.output_file}: {e}")
-
-# แสดงผลลัพธ์ (ถ้าไม่ได้ใช้ --no-gui)
-if not args.no_gui:
-    cv2.imshow("Test Image (Original)", image)
-    cv2.imshow("Threshold (Processed)", thresh)
-    cv2.imshow("OCR Result (Output)", output_image)
-    cv2.waitKey(0)
-    cv2.destroyAllWindows()
-else:
-    # ผู้ใช้สั่งให้ไม่เปิดหน้าต่าง GUI
-    pass
\ No newline at end of file
+        print(f"ไม่สามารถเขียนไฟล์ {path}: {e}", file=sys.stderr)
+
+
+def report_glyph_cache(engine):
+    """พิมพ์สถิติ glyph cache"""
+    cache = engine.glyph_cache
+    if cache is None:
+        return
+    st = cache.stats
+    total = st["hits"] + st["near_hits"] + st["misses"]
+    rate = (st["hits"] + st["near_hits"]) / total if total else 0.0
+    print(f"glyph cache: hit {st['hits']}, near-hit {st['near_hits']}, "
+          f"miss {st['misses']} ({rate:.2%}), {len(cache)} รายการ")
+
+
+def report_noise(engine):
+    """พิมพ์จำนวน component ที่เล็กเกินไป (noise) ซึ่งถูกกรองทิ้งก่อนถึงขั้น match"""
+    st = engine.noise_stats
+    if not st["pages"]:
+        return
+    rate = st["noise_components"] / st["components"] if st["components"] else 0.0
+    print(f"binarize={engine.binarizer}: noise {st['noise_components']}/{st['components']} "
+          f"components ({rate:.2%}) ใน {st['pages']} หน้า", file=sys.stderr)
+
+
+def report_split(engine):
+    """พิมพ์จำนวนกล่องกว้างเกินบรรทัด และจำนวนที่ถูกแยกเป็นตัวอักษรที่ติดกัน"""
+    st = engine.split_stats
+    if not engine.split_touching or not st["wide"]:
+        return
+    print(f"split-touching: แยก {st['split']}/{st['wide']} กล่องที่กว้างเกิน "
+          f"(+{st['pieces']} ตัวอักษร)", file=sys.stderr)
+
+
+def report_debug(engine):
+    """ปิด debug writer (เขียนหน้าที่ค้างในคิว) แล้วพิมพ์จำนวน ROI ที่บันทึก"""
+    writer = engine.debug_writer
+    if writer is None:
+        return
+    writer.close()
+    st = writer.stats
+    if st["glyphs"] or st["dropped"] or st["rate_limited"]:
+        print(f"บันทึก ROI ที่จับคู่ไม่ผ่าน {st['glyphs']} ตัว ({st['pages']} ไฟล์) ไว้ที่ "
+              f"{writer.out_dir}/ (ข้ามจาก rate limit {st['rate_limited']}, "
+              f"คิวเต็ม {st['dropped']})", file=sys.stderr)
+
+
+def save_table(tables, path):
+    """บันทึกตารางผล (.npz แบบ columnar) ถ้าระบุ --table"""
+    if not path:
+        return
+    try:
+        tables.save(path)
+        print(f"บันทึกตารางผล ({len(tables.pages)} หน้า) ลงไฟล์: {path}", file=sys.stderr)
+    except Exception as e:
+        print(f"ไม่สามารถเขียนไฟล์ {path}: {e}", file=sys.stderr)
+
+
+def run_batch_cli(args):
+    """โหมด batch: OCR หลายไฟล์ด้วย process pool (หรือ thread pipeline) แล้วเขียนผลเป็น JSON Lines"""
+    # multiprocessing/result_table โหลดเฉพาะเมื่อใช้ (โหมดภาพเดียวเริ่มเร็วขึ้น)
+    from batch_ocr import expand_inputs, run_batch, write_jsonl
+    from result_table import TableWriter
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("Error: ไม่พบไฟล์ภาพจาก inputs ที่ระบุ", file=sys.stderr)
+        return 1
+
+    engine_kwargs = engine_options(args)
+    if args.pipeline:
+        # thread pipeline: engine เดียว, อ่านไฟล์/เตรียมภาพ/match ซ้อนกัน
+        engine = OCREngine(default_template_dirs(), **engine_kwargs)
+        pipeline = PagePipeline(engine, args.readers, args.preprocess_workers,
+                                args.match_workers, args.queue_size)
+        records = run_pipeline(paths, ordered=args.ordered, pipeline=pipeline)
+        metrics = pipeline.engine.metrics
+    else:
+        metrics = Metrics() if engine_kwargs.pop("metrics") else None
+        records = run_batch(paths, workers=args.workers, chunksize=args.chunksize,
+                            ordered=args.ordered, engine_kwargs=engine_kwargs, metrics=metrics)
+    tables = TableWriter()
+    if args.table:
+        records = tables.tee(records)
+    ok, errors = write_jsonl(records, args.output_file)
+    print(f"OCR เสร็จ {ok} ไฟล์, ผิดพลาด {errors} ไฟล์", file=sys.stderr)
+    save_table(tables, args.table)
+    if args.pipeline:
+        print(pipeline.format_report(), file=sys.stderr)
+    save_metrics(metrics, args.metrics)
+    return 1 if errors and not ok else 0
+
+
+def run_stream_cli(args):
+    """โหมด stream: อ่านภาพทีละแถบ และพิมพ์แต่ละบรรทัดทันทีที่แถบที่อ่านแล้วผ่านบรรทัดนั้นไป"""
+    engine = OCREngine(default_template_dirs(), verbose=True, **engine_options(args))
+    try:
+        page = open_page(args.image)
+    except IOError as e:
+        print(f"Error: {e}")
+        return 1
+
+    rows = []
+    for line in recognize_stream(engine, page, args.band_height, args.band_overlap):
+        print(line["line"], flush=True)
+        rows.append(line["row"])
+    report_glyph_cache(engine)
+    if args.verbose:
+        report_noise(engine)
+    report_split(engine)
+    save_metrics(engine.metrics, args.metrics)
+    engine.close()
+
+    if args.output_file:
+        try:
+            with open(args.output_file, 'w', encoding='utf-8') as f:
+                f.write(''.join(rows))
+            print(f"บันทึกผล OCR ลงไฟล์: {args.output_file}")
+        except Exception as e:
+            print(f"ไม่สามารถเขียนไฟล์ {args.output_file}: {e}")
+    return 0
+
+
+def main():
+    # ---- Command line options ----
+    parser = argparse.ArgumentParser(description="Simple template-matching OCR")
+    parser.add_argument('--no-gui', action='store_true', help='Do not show OpenCV windows')
+    parser.add_argument('--output-file', '-o', help='Write OCR result to a file')
+    parser.add_argument('--template-cache', metavar='NPZ',
+                        help='Use a compiled template bank (created/updated automatically, '
+                             'see template_cache.py)')
+    parser.add_argument('--prune-k', type=int, metavar='K',
+                        help='Two-stage matching: fully score only the K nearest templates')
+    parser.add_argument('--prune-check', action='store_true',
+                        help='With --prune-k: also run the exhaustive match and report '
+                             'how often the pruned answer differs')
+    parser.add_argument('--binarize', choices=BINARIZERS, default="otsu",
+                        help='Page threshold: global otsu (default), tiled (Otsu per tile, '
+                             'for uneven lighting) or sauvola (see binarization.py)')
+    parser.add_argument('--segmentation', choices=SEGMENTERS, default="contours",
+                        help='Glyph segmentation backend (default: contours)')
+    parser.add_argument('--merge-parts', action='store_true',
+                        help='With --segmentation components: merge stacked parts of one '
+                             'glyph such as the dot of i/j')
+    parser.add_argument('--split-touching', action='store_true',
+                        help='Cut boxes wider than their line that fail to match at '
+                             'vertical projection minima when the pieces match')
+    parser.add_argument('--glyph-cache', type=int, default=0, metavar='N',
+                        help='Cache the match of up to N distinct glyph bitmaps '
+                             '(repeated glyphs skip template matching)')
+    parser.add_argument('--glyph-cache-file', metavar='NPZ',
+                        help='With --glyph-cache: load/save the cache so it is shared '
+                             'across runs and batch workers')
+    parser.add_argument('--glyph-cache-perceptual', action='store_true',
+                        help='With --glyph-cache: also reuse results of near-identical glyphs')
+    parser.add_argument('--scales', type=parse_scales, metavar='S1,S2,...',
+                        help='Template pyramid, e.g. 30,48,64: every line is matched at '
+                             'the smallest size >= its glyph height (sizes below the '
+                             f'{TEMPLATE_HEIGHT}px base are rejected)')
+    parser.add_argument('--annotate', metavar='PNG',
+                        help='Single-image mode: save the page with the recognized boxes '
+                             'drawn on it (only then, or with the GUI, is the page copied '
+                             'and drawn)')
+    parser.add_argument('--top-k', type=int, default=1, metavar='K',
+                        help='Keep the K best candidate chars and their scores for every '
+                             'glyph (JSON records get "candidates"/"candidate_scores")')
+    parser.add_argument('--table', metavar='NPZ',
+                        help='Also save boxes, chars, scores and candidates of all glyphs as '
+                             'a columnar table (see result_table.py)')
+    parser.add_argument('--image', default=TEST_IMAGE_PATH,
+                        help=f'Image to OCR in single-image mode (default: {TEST_IMAGE_PATH})')
+    parser.add_argument('--stream', action='store_true',
+                        help='Process --image in horizontal bands, same output as the '
+                             'whole-page run (for very large scans; .npy pages are memory-mapped)')
+    parser.add_argument('--band-height', type=int, default=BAND_HEIGHT,
+                        help='--stream: rows per band')
+    parser.add_argument('--band-overlap', type=int, default=BAND_OVERLAP,
+                        help='--stream: extra rows read above/below each band, '
+                             'must exceed the tallest glyph')
+    parser.add_argument('inputs', nargs='*',
+                        help='Batch mode: image files, directories or glob patterns. '
+                             'Results are written as JSON Lines (stdout or --output-file)')
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help='Batch mode: number of worker processes (default: CPU count)')
+    parser.add_argument('--chunksize', type=int, default=1,
+                        help='Batch mode: images handed to a worker at a time')
+    parser.add_argument('--ordered', action='store_true',
+                        help='Batch mode: emit results in input order instead of completion order')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Batch mode: one process with overlapping thread stages '
+                             '(read -> preprocess -> match) instead of a process pool; '
+                             'prints the utilization of every stage')
+    parser.add_argument('--readers', type=int, default=READERS,
+                        help='--pipeline: image decoding threads')
+    parser.add_argument('--preprocess-workers', type=int, default=None,
+                        help='--pipeline: threshold/segment/normalize threads '
+                             '(default: half the CPUs)')
+    parser.add_argument('--match-workers', type=int, default=None,
+                        help='--pipeline: matching threads (default: the other half)')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+                        help='--pipeline: pages buffered between two stages')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='Time every stage and save counters/histograms '
+                             '(PATH ending in .prom: Prometheus text format, otherwise JSON)')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='Also print the noise components dropped by segmentation '
+                             '(stderr; always counted in --metrics)')
+    parser.add_argument('--debug-dir', metavar='DIR',
+                        help='Save glyphs below the match threshold here, one .npz + .json '
+                             'per page, written in the background (default: off)')
+    parser.add_argument('--debug-sample', type=float, default=DEBUG_SAMPLE,
+                        help='Fraction of rejected glyphs to save')
+    parser.add_argument('--debug-rate', type=float, default=DEBUG_RATE,
+                        help='At most this many rejected glyphs saved per second')
+    # เลิกใช้แล้ว: ไม่บันทึกเป็นค่าเริ่มต้นอยู่แล้ว รับไว้เพื่อให้สคริปต์เก่ายังรันได้
+    parser.add_argument('--no-debug', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--profile', metavar='PSTATS',
+                        help='Run under cProfile, save the stats to PSTATS and print the '
+                             'top functions (batch mode: only the main process, use -j 1)')
+    args = parser.parse_args()
+
+    if not args.profile:
+        return run(args)
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(run, args)
+    finally:
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+        print(f"บันทึก profile ลงไฟล์: {args.profile}", file=sys.stderr)
+
+
+def run(args):
+    if args.inputs:
+        return run_batch_cli(args)
+    if args.stream:
+        return run_stream_cli(args)
+
+    # --- 1. โหลดเทมเพลต (ทำครั้งเดียว) ---
+    engine = OCREngine(default_template_dirs(), verbose=True, **engine_options(args))
+
+    # --- 2. โหลดและประมวลผลภาพทดสอบ ---
+    with timed(engine.metrics, "imread"):
+        image = cv2.imread(args.image)
+    if image is None:
+        print(f"Error: ไม่พบไฟล์ทดสอบ '{args.image}'")
+        print("กรุณาสร้างไฟล์ภาพ ที่มีข้อความด้วยฟอนต์ที่ตรงกับเทมเพลตก่อน")
+        return 1
+
+    # ใช้ THRESH_BINARY_INV เพื่อให้ตัวอักษรเป็น "สีขาว" (255)
+    # และพื้นหลังเป็น "สีดำ" (0) เหมือนกับเทมเพลต
+    thresh = engine.binarize(image)
+
+    # --- 3.-5. Segmentation + Template Matching ---
+    # ROI ที่จับคู่ไม่ผ่านจะถูกบันทึกโดย debug writer (thread แยก)
+    result = engine.recognize_binary(thresh, page=args.image)
+    print(f"พบ {len(result['chars']) + len(result['rejected'])} ตัวอักษรที่อาจเป็นไปได้")
+
+    # --- 6. แสดงผลลัพธ์ ---
+    print("-" * 30)
+    print("Detected (grouped by baseline):")
+    # แสดงแต่ละบรรทัดพร้อมช่องว่างระหว่างคำ (ประเมินจากระยะห่างแนวนอน)
+    for line in result["lines"]:
+        print(line)
+    print("-" * 30)
+
+    if args.table:
+        from result_table import TableWriter
+        tables = TableWriter()
+        tables.add(result, args.image)
+        save_table(tables, args.table)
+    report_glyph_cache(engine)
+    if args.verbose:
+        report_noise(engine)
+    report_split(engine)
+    report_debug(engine)
+    save_metrics(engine.metrics, args.metrics)
+    if args.prune_k and args.prune_check:
+        st = engine.prune_stats
+        rate = st["mismatches"] / st["glyphs"] if st["glyphs"] else 0.0
+        print(f"prune-k={args.prune_k}: ผลต่างจากการเทียบทุกเทมเพลต "
+              f"{st['mismatches']}/{st['glyphs']} ตัว ({rate:.2%})")
+
+    # ผลลัพธ์แบบเรียบ (ต่อกันเป็นสตริงเดียว) สำหรับการส่งออกหรือการใช้งานต่อ
+    final_string = result["text"]
+
+    # ส่งออกแบบเรียบตรงไปยัง stdout (เหมาะสำหรับการจับผลลัพธ์จาก terminal)
+    print(final_string)
+
+    # ถ้าผู้ใช้ต้องการบันทึกผลลงไฟล์
+    if args.output_file:
+        try:
+            with open(args.output_file, 'w', encoding='utf-8') as f:
+                f.write(final_string)
+            print(f"บันทึกผล OCR ลงไฟล์: {args.output_file}")
+        except Exception as e:
+            print(f"ไม่สามารถเขียนไฟล์ {args.output_file}: {e}")
+    engine.close()
+
+    # วาดผลลัพธ์เฉพาะเมื่อมีคนดู (GUI) หรือขอไฟล์ --annotate: headless ไม่ copy ภาพหน้าเลย
+    if not args.no_gui or args.annotate:
+        annotate_page(args, image, thresh, result)
+    return 0
+
+
+def annotate_page(args, image, thresh, result):
+    """วาดกรอบทุกตัวอักษรจากตารางผลในครั้งเดียว แล้วบันทึก (--annotate) และ/หรือแสดงใน GUI"""
+    from annotate import annotate, show
+    from result_table import page_table
+
+    output_image = annotate(image, page_table(result))
+    if args.annotate:
+        if cv2.imwrite(args.annotate, output_image):
+            print(f"บันทึกภาพผลลัพธ์ลงไฟล์: {args.annotate}")
+        else:
+            print(f"ไม่สามารถเขียนไฟล์ {args.annotate}")
+    if not args.no_gui:
+        show(image, thresh, output_image)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+# --- สีและรูปแบบของภาพผลลัพธ์ (BGR) ---
+ACCEPTED_COLOR = (0, 255, 0)
+REJECTED_COLOR = (0, 0, 255)
+TEXT_COLOR = (255, 0, 0)
+LINE_THICKNESS = 2
+FONT_SCALE = 0.4
+
+
+def _rectangles(x, y, w, h):
+    """(N, 4, 2) int32 corner points of the boxes, for one cv2.polylines call."""
+    x0, y0, x1, y1 = x, y, x + w, y + h
+    return np.stack([np.stack([x0, y0], 1), np.stack([x1, y0], 1),
+                     np.stack([x1, y1], 1), np.stack([x0, y1], 1)], 1).astype(np.int32)
+
+
+def annotate(image, table):
+    """Draw the glyphs of one page table (result_table.page_table) onto a
+    BGR copy of ``image``: accepted boxes in green with their char, rejected
+    ones in red. All boxes of a color are drawn with a single polylines
+    call. Returns the new image; ``image`` is not modified.
+    """
+    canvas = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image.copy()
+    ok = table["accepted"]
+    rects = _rectangles(table["x"], table["y"], table["w"], table["h"])
+    for mask, color in ((ok, ACCEPTED_COLOR), (~ok, REJECTED_COLOR)):
+        if mask.any():
+            cv2.polylines(canvas, list(rects[mask]), True, color, LINE_THICKNESS)
+    for x, y, char in zip(table["x"][ok].tolist(), table["y"][ok].tolist(),
+                          table["char"][ok].tolist()):
+        cv2.putText(canvas, char, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, FONT_SCALE,
+                    TEXT_COLOR, LINE_THICKNESS)
+    return canvas
+
+
+def show(image, thresh, annotated):
+    """OpenCV windows of the original, the binary page and the annotated result."""
+    cv2.imshow("Test Image (Original)", image)
+    cv2.imshow("Threshold (Processed)", thresh)
+    cv2.imshow("OCR Result (Output)", annotated)
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
@@ -0,0 +1,147 @@
+import glob
+import json
+import os
+import sys
+from multiprocessing import Pool, util
+
+import cv2
+
+from metrics import timed
+from ocr_engine import (OCREngine, TEMPLATE_HEIGHT, TEMPLATE_WIDTH, compile_template_cache,
+                        default_template_dirs)
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+# engine ของแต่ละ worker process (สร้างครั้งเดียวใน initializer)
+_worker_engine = None
+
+
+def expand_inputs(inputs):
+    """Expand files, directories and glob patterns into a list of image paths.
+
+    Directories are scanned (non-recursively) for IMAGE_EXTS files, globs are
+    expanded with ``recursive=True`` so ``scans/**/*.png`` works. The order of
+    ``inputs`` is kept; names inside a directory/glob are sorted.
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            names = sorted(os.listdir(item))
+            paths.extend(os.path.join(item, n) for n in names
+                         if os.path.splitext(n)[1].lower() in IMAGE_EXTS)
+        elif glob.has_magic(item):
+            paths.extend(p for p in sorted(glob.glob(item, recursive=True))
+                         if os.path.isfile(p))
+        else:
+            # plain path: keep it even if missing so it shows up as an error record
+            paths.append(item)
+    return paths
+
+
+def _init_worker(engine_kwargs):
+    global _worker_engine
+    _worker_engine = OCREngine(**engine_kwargs)
+    # workers are stopped with close()/join(), which runs this finalizer
+    # (saves the glyph cache file, flushes the debug writer)
+    util.Finalize(None, _worker_engine.close, exitpriority=10)
+
+
+def _ocr_file(indexed_path):
+    index, path = indexed_path
+    record = {"index": index, "path": path}
+    metrics = _worker_engine.metrics
+    try:
+        with timed(metrics, "imread"):
+            image = cv2.imread(path)
+        if image is None:
+            record["error"] = f"cannot read image '{path}'"
+        else:
+            record.update(_worker_engine.recognize(image, page=path))
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    if metrics is not None:
+        # this image's measurements travel with the record to the parent process
+        record["_metrics"] = metrics.snapshot(reset=True)
+    return record
+
+
+def _collect_metrics(record, metrics):
+    data = record.pop("_metrics", None)
+    if data is not None and metrics is not None:
+        metrics.merge(data)
+    return record
+
+
+def run_batch(paths, workers=None, chunksize=1, ordered=False, engine_kwargs=None,
+              metrics=None):
+    """OCR many image files, yielding one record (dict) per image.
+
+    workers      - number of processes (default: os.cpu_count()); 1 runs
+                   everything in this process
+    chunksize    - number of images handed to a worker at a time
+    ordered      - yield in input order instead of completion order
+    engine_kwargs - passed to OCREngine in every worker
+    metrics      - a metrics.Metrics that collects the stage timings and
+                   histograms of all workers
+
+    Each record has "index" (position in ``paths``), "path" and either the
+    fields of OCREngine.recognize() or an "error" message.
+    """
+    engine_kwargs = dict(engine_kwargs or {})
+    if metrics is not None:
+        engine_kwargs["metrics"] = True
+    jobs = list(enumerate(paths))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs) or 1))
+
+    if engine_kwargs.get("template_cache"):
+        # compile (if needed) once here so the workers only memory-map the file(s);
+        # same sizes as the workers' engines, or they would compile their own
+        compile_template_cache(engine_kwargs.get("template_dirs") or default_template_dirs(),
+                               engine_kwargs["template_cache"],
+                               engine_kwargs.get("width", TEMPLATE_WIDTH),
+                               engine_kwargs.get("height", TEMPLATE_HEIGHT),
+                               engine_kwargs.get("scales"))
+
+    if workers == 1:
+        _init_worker(engine_kwargs)
+        for job in jobs:
+            yield _collect_metrics(_ocr_file(job), metrics)
+        _worker_engine.close()
+        return
+
+    pool = Pool(workers, initializer=_init_worker, initargs=(engine_kwargs,))
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for record in imap(_ocr_file, jobs, chunksize=max(1, chunksize)):
+            yield _collect_metrics(record, metrics)
+        # close + join (not terminate) so the workers run engine.close()
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def write_jsonl(records, out=None):
+    """Write records as JSON Lines to ``out`` (file path) or stdout.
+
+    Records are flushed one by one so the output can be consumed while the
+    batch is still running. Returns (ok_count, error_count).
+    """
+    f = open(out, 'w', encoding='utf-8') if out else sys.stdout
+    ok = errors = 0
+    try:
+        for record in records:
+            if "error" in record:
+                errors += 1
+            else:
+                ok += 1
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+    finally:
+        if out:
+            f.close()
+    return ok, errors
@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import platform
+import string
+import sys
+import tempfile
+import time
+from itertools import zip_longest
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+import Create_image
+from binarization import BINARIZERS
+from ocr_engine import OCREngine, parse_scales
+from segmentation import SEGMENTERS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --- การตั้งค่าหน้าทดสอบ ---
+PAGES = 20
+PAGE_WIDTH = 1600
+PAGE_HEIGHT = 2000
+DENSITY = 0.9        # สัดส่วนความกว้างบรรทัดที่มีข้อความ
+WORD_LENGTH = (2, 9)  # ความยาวคำแบบสุ่ม (min, max)
+WORD_SPACES = 2      # จำนวน space ระหว่างคำ (space เดียวแคบเกินไปสำหรับบางฟอนต์)
+ALPHABET = string.ascii_letters + string.digits
+
+STAGES = ("load", "threshold", "segment", "normalize", "match", "group")
+
+
+def random_line(font, max_width, rng, density=DENSITY, word_spaces=WORD_SPACES):
+    """Random words until ``density * max_width`` pixels are filled.
+    Returns (text drawn on the page, ground truth with single spaces)."""
+    words = []
+    gap = " " * word_spaces
+    budget = density * max_width
+    while True:
+        word = ''.join(rng.choice(list(ALPHABET), rng.integers(*WORD_LENGTH, endpoint=True)))
+        if Create_image.text_width(gap.join(words + [word]), font) > budget:
+            break
+        words.append(word)
+    return gap.join(words), ' '.join(words)
+
+
+def generate_page(font, width=PAGE_WIDTH, height=PAGE_HEIGHT, lines=None, density=DENSITY,
+                  noise=0.0, word_spaces=WORD_SPACES, rng=None):
+    """Render a synthetic page with the Create_image.py text renderer.
+
+    ``lines`` defaults to as many lines as fit; ``noise`` is the fraction
+    of pixels set to random black/white (salt and pepper). Returns
+    (gray uint8 page, list of ground truth lines).
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    margin = 10
+    fit = max(1, (height - 2 * margin) // Create_image.line_height(font))
+    lines = fit if lines is None else lines
+
+    drawn, truth = [], []
+    for _ in range(lines):
+        text, words = random_line(font, width - 2 * margin, rng, density, word_spaces)
+        drawn.append(text)
+        truth.append(words)
+
+    img = Image.new('L', (width, height), color=255)
+    Create_image.draw_text(ImageDraw.Draw(img), "\n".join(drawn), font, margin, margin, fill=0)
+    page = np.array(img)
+
+    if noise > 0:
+        flip = rng.random(page.shape) < noise
+        page[flip] = rng.choice(np.array([0, 255], dtype=np.uint8), int(flip.sum()))
+    return page, truth
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def score_page(lines, truth):
+    """(char errors, truth chars, exact lines, truth lines) of one page.
+    Lines are paired in order; spaces are ignored for the char errors."""
+    char_errors = exact = 0
+    for got, want in zip_longest(lines, truth, fillvalue=""):
+        char_errors += edit_distance(got.replace(" ", ""), want.replace(" ", ""))
+        exact += bool(want) and got == want
+    return char_errors, sum(len(t.replace(" ", "")) for t in truth), exact, len(truth)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if unknown)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux, in bytes on macOS
+    return rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else rss / 1024.0
+
+
+def run_page(engine, path, timings):
+    """OCR one page file, adding the time of every stage to ``timings``."""
+    t0 = time.perf_counter()
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    t1 = time.perf_counter()
+    thresh = engine.binarize(image)
+    t2 = time.perf_counter()
+    matched = []
+    boxes = engine.segment(thresh, matched=matched)
+    t3 = time.perf_counter()
+    groups = engine.normalize_groups(thresh, boxes, matched)
+    t4 = time.perf_counter()
+    chars, scores, *top = engine.merge_groups(
+        len(boxes), matched + [(idx, *engine.match(rois)) for idx, rois in groups])
+    t5 = time.perf_counter()
+    result = engine.assemble(boxes, chars, scores, *top)
+    t6 = time.perf_counter()
+
+    for stage, dt in zip(STAGES, np.diff([t0, t1, t2, t3, t4, t5, t6])):
+        timings[stage] += dt
+    return result, len(boxes)
+
+
+def run_benchmark(engine, pages):
+    """Time the engine on ``pages`` [(path, truth lines)] and return the
+    results as a JSON-serializable dict."""
+    timings = dict.fromkeys(STAGES, 0.0)
+    glyphs = char_errors = chars = exact = lines = 0
+    for path, truth in pages:
+        result, n = run_page(engine, path, timings)
+        glyphs += n
+        e, c, x, t = score_page(result["lines"], truth)
+        char_errors += e
+        chars += c
+        exact += x
+        lines += t
+
+    total = sum(timings.values())
+    n_pages = len(pages)
+    return {
+        "pages": n_pages,
+        "glyphs": glyphs,
+        "total_s": total,
+        "pages_per_sec": n_pages / total if total else None,
+        "glyphs_per_sec": glyphs / total if total else None,
+        "match_glyphs_per_sec": glyphs / timings["match"] if timings["match"] else None,
+        "stages": {s: {"total_s": t, "ms_per_page": 1000.0 * t / max(1, n_pages),
+                       "share": t / total if total else None}
+                   for s, t in timings.items()},
+        "accuracy": {"char": 1.0 - char_errors / chars if chars else None,
+                     "line": exact / lines if lines else None,
+                     "char_errors": char_errors, "chars": chars},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_report(results):
+    print(f"{results['pages']} หน้า, {results['glyphs']} glyphs, {results['total_s']:.3f} s")
+    for stage, st in results["stages"].items():
+        print(f"  {stage:<10} {st['ms_per_page']:9.2f} ms/หน้า  {st['share']:6.1%}")
+    print(f"  {results['pages_per_sec']:.2f} pages/s, {results['glyphs_per_sec']:.0f} glyphs/s "
+          f"(match only {results['match_glyphs_per_sec']:.0f} glyphs/s)")
+    acc = results["accuracy"]
+    print(f"  accuracy: char {acc['char']:.2%}, line {acc['line']:.2%}")
+    if results["peak_rss_mb"] is not None:
+        print(f"  peak RSS: {results['peak_rss_mb']:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the OCR pipeline on synthetic pages with ground truth")
+    parser.add_argument('--pages', type=int, default=PAGES)
+    parser.add_argument('--width', type=int, default=PAGE_WIDTH)
+    parser.add_argument('--height', type=int, default=PAGE_HEIGHT)
+    parser.add_argument('--lines', type=int, default=None,
+                        help='Text lines per page (default: as many as fit)')
+    parser.add_argument('--density', type=float, default=DENSITY,
+                        help='Fraction of each line width filled with text')
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help='Fraction of salt-and-pepper noise pixels')
+    parser.add_argument('--word-spaces', type=int, default=WORD_SPACES)
+    parser.add_argument('--font', default=Create_image.FONT_PATH)
+    parser.add_argument('--font-size', type=int, default=Create_image.FONT_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', metavar='DIR',
+                        help='Keep the generated pages (+ .txt ground truth) in DIR')
+    parser.add_argument('--json', metavar='PATH', help='Save the results as JSON')
+    parser.add_argument('--template-cache', metavar='NPZ')
+    parser.add_argument('--prune-k', type=int, metavar='K')
+    parser.add_argument('--segmentation', choices=SEGMENTERS, default="contours")
+    parser.add_argument('--binarize', choices=BINARIZERS, default="otsu")
+    parser.add_argument('--merge-parts', action='store_true')
+    parser.add_argument('--glyph-cache', type=int, default=0, metavar='N')
+    parser.add_argument('--scales', type=parse_scales, metavar='S1,S2,...')
+    parser.add_argument('--top-k', type=int, default=1, metavar='K')
+    parser.add_argument('--split-touching', action='store_true')
+    args = parser.parse_args()
+
+    try:
+        font = ImageFont.truetype(args.font, args.font_size)
+    except IOError:
+        print(f"Error: Font file '{args.font}' not found.")
+        return 1
+
+    engine_kwargs = {"template_cache": args.template_cache, "prune_k": args.prune_k,
+                     "segmenter": args.segmentation, "merge_parts": args.merge_parts,
+                     "glyph_cache_size": args.glyph_cache, "scales": args.scales,
+                     "top_k": args.top_k, "binarizer": args.binarize,
+                     "split_touching": args.split_touching}
+    t = time.perf_counter()
+    engine = OCREngine(**engine_kwargs)
+    init_s = time.perf_counter() - t
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = args.keep or tmp
+        os.makedirs(out_dir, exist_ok=True)
+        rng = np.random.default_rng(args.seed)
+        pages = []
+        for i in range(args.pages):
+            page, truth = generate_page(font, args.width, args.height, args.lines,
+                                        args.density, args.noise, args.word_spaces, rng)
+            path = os.path.join(out_dir, f"page_{i:04d}.png")
+            cv2.imwrite(path, page)
+            if args.keep:
+                with open(path[:-4] + ".txt", 'w', encoding='utf-8') as f:
+                    f.write("\n".join(truth))
+            pages.append((path, truth))
+
+        results = run_benchmark(engine, pages)
+
+    results["engine_init_s"] = init_s
+    if args.split_touching:
+        results["split_touching"] = dict(engine.split_stats)
+    results["config"] = {k: v for k, v in vars(args).items() if k not in ("json", "keep")}
+    results["environment"] = {"python": platform.python_version(), "opencv": cv2.__version__,
+                              "numpy": np.__version__, "platform": platform.platform(),
+                              "templates": len(engine.bank)}
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"บันทึกผล benchmark ลงไฟล์: {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,235 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+BINARIZERS = ("otsu", "tiled", "sauvola")
+# tiled Otsu: the page is cut into TILE_SIZE x TILE_SIZE tiles and every tile is
+# thresholded with the histogram of the TILE_WINDOW x TILE_WINDOW tiles around it
+TILE_SIZE = 64
+TILE_WINDOW = 3
+# windows whose two Otsu classes are closer than this (gray levels) hold no
+# text (blank paper, noise) and take the threshold of the nearest tiles with text
+MIN_CONTRAST = 40
+# Sauvola: T = mean * (1 + k * (std / R - 1)) over a SAUVOLA_WINDOW square
+SAUVOLA_WINDOW = 31
+SAUVOLA_K = 0.2
+SAUVOLA_R = 128.0
+
+
+def otsu_from_histogram(hist):
+    """Otsu threshold of 256-bin histogram(s), vectorized over the leading
+    axes. Returns (thresholds, separation): int arrays of the threshold
+    (same value as cv2.threshold(..., THRESH_OTSU) on the pixels) and the
+    distance between the two class means."""
+    hist = np.asarray(hist, dtype=np.float64)
+    levels = np.arange(256)
+    w0 = np.cumsum(hist, axis=-1)
+    w1 = w0[..., -1:] - w0
+    s0 = np.cumsum(hist * levels, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mu0 = s0 / w0
+        mu1 = (s0[..., -1:] - s0) / w1
+        between = np.nan_to_num(w0 * w1 * (mu0 - mu1) ** 2, nan=-1.0)
+    # first maximum, like OpenCV
+    t = np.argmax(between, axis=-1)
+    sep = np.take_along_axis(np.nan_to_num(mu1 - mu0), t[..., None], axis=-1)[..., 0]
+    return t, sep
+
+
+class PageStats:
+    """Statistics of one grayscale page, computed on first use and kept for
+    every later binarization pass of the same page: per-tile histograms
+    (one bincount per row of tiles) with their integral over the tile grid,
+    and the local mean/deviation of the Sauvola window (float32 box filters)."""
+
+    def __init__(self, gray, tile=TILE_SIZE):
+        self.gray = gray
+        self.tile = tile
+        self._tile_hist = None
+        self._hist_integral = None
+        self._mean_std = {}
+        self._thresholds = {}
+
+    @property
+    def grid(self):
+        h, w = self.gray.shape
+        return -(-h // self.tile), -(-w // self.tile)
+
+    @property
+    def tile_histograms(self):
+        """(tiles_y, tiles_x, 256) int64 histograms."""
+        if self._tile_hist is None:
+            ty, tx = self.grid
+            col_id = (np.arange(self.gray.shape[1], dtype=np.int64) // self.tile) * 256
+            hist = np.empty((ty, tx, 256), dtype=np.int64)
+            # one row of tiles at a time: temporaries stay the size of a strip
+            for i in range(ty):
+                strip = self.gray[i * self.tile:(i + 1) * self.tile]
+                hist[i] = np.bincount((strip + col_id).ravel(),
+                                      minlength=tx * 256).reshape(tx, 256)
+            self._tile_hist = hist
+        return self._tile_hist
+
+    @property
+    def histogram(self):
+        """Histogram of the whole page (sum of the tile histograms)."""
+        return self.tile_histograms.sum(axis=(0, 1))
+
+    def window_histograms(self, window=TILE_WINDOW):
+        """Histogram of the ``window`` x ``window`` tiles around every tile,
+        (tiles_y, tiles_x, 256), from the integral histogram (4 lookups per
+        tile whatever the window size)."""
+        if self._hist_integral is None:
+            ty, tx = self.grid
+            integral = np.zeros((ty + 1, tx + 1, 256), dtype=np.int64)
+            integral[1:, 1:] = self.tile_histograms.cumsum(0).cumsum(1)
+            self._hist_integral = integral
+        ty, tx = self.grid
+        r = window // 2
+        y0 = np.clip(np.arange(ty) - r, 0, ty)
+        y1 = np.clip(np.arange(ty) + r + 1, 0, ty)
+        x0 = np.clip(np.arange(tx) - r, 0, tx)
+        x1 = np.clip(np.arange(tx) + r + 1, 0, tx)
+        I = self._hist_integral
+        return (I[np.ix_(y1, x1)] - I[np.ix_(y0, x1)] - I[np.ix_(y1, x0)]
+                + I[np.ix_(y0, x0)])
+
+    def global_threshold(self):
+        if "global" not in self._thresholds:
+            self._thresholds["global"] = int(otsu_from_histogram(self.histogram)[0])
+        return self._thresholds["global"]
+
+    def tile_thresholds(self, window=TILE_WINDOW, min_contrast=MIN_CONTRAST,
+                        global_threshold=None):
+        """(tiles_y, tiles_x) Otsu threshold per tile.
+
+        Tiles without contrast are filled in from their neighbours ring by
+        ring (the global threshold would turn a darker blank margin into
+        ink); only a page without any contrast uses the global threshold.
+        """
+        key = ("tiled", window, min_contrast, global_threshold)
+        if key not in self._thresholds:
+            t, sep = otsu_from_histogram(self.window_histograms(window))
+            t = t.astype(np.float32)
+            valid = (sep >= min_contrast).astype(np.float32)
+            if not valid.any():
+                if global_threshold is None:
+                    global_threshold = self.global_threshold()
+                t[:] = global_threshold
+                valid[:] = 1.0
+            while not valid.all():
+                total = cv2.blur(t * valid, (3, 3), borderType=cv2.BORDER_REPLICATE)
+                count = cv2.blur(valid, (3, 3), borderType=cv2.BORDER_REPLICATE)
+                fill = (valid == 0) & (count > 0)
+                t[fill] = total[fill] / count[fill]
+                valid[fill] = 1.0
+            self._thresholds[key] = t
+        return self._thresholds[key]
+
+    def local_mean_std(self, window=SAUVOLA_WINDOW):
+        """Mean and standard deviation of the ``window`` x ``window``
+        neighbourhood of every pixel (clipped at the page border), float32.
+        Box sums with a zero border, divided by the clipped window area;
+        computed in place, so two page-sized float32 arrays are allocated."""
+        if window not in self._mean_std:
+            h, w = self.gray.shape
+            r = window // 2
+            # pixels of the window inside the page, per row and per column
+            rows = (np.minimum(np.arange(h) + r + 1, h) - np.maximum(np.arange(h) - r, 0))
+            cols = (np.minimum(np.arange(w) + r + 1, w) - np.maximum(np.arange(w) - r, 0))
+            rows = rows.astype(np.float32)[:, None]
+            cols = cols.astype(np.float32)[None, :]
+
+            mean = cv2.boxFilter(self.gray, cv2.CV_32F, (window, window), normalize=False,
+                                 borderType=cv2.BORDER_CONSTANT)
+            mean /= rows
+            mean /= cols
+            var = cv2.sqrBoxFilter(self.gray, cv2.CV_32F, (window, window), normalize=False,
+                                   borderType=cv2.BORDER_CONSTANT)
+            var /= rows
+            var /= cols
+            var -= mean * mean
+            np.maximum(var, 0.0, out=var)
+            self._mean_std[window] = mean, np.sqrt(var, out=var)
+        return self._mean_std[window]
+
+
+def _ink_below(gray, thresholds):
+    """Binary page (text = 255) where gray <= the per-pixel threshold map
+    (a float32 array that is overwritten)."""
+    np.floor(thresholds, out=thresholds)
+    np.clip(thresholds, 0, 255, out=thresholds)
+    return cv2.compare(gray, thresholds.astype(np.uint8), cv2.CMP_LE)
+
+
+def binarize(gray, method="otsu", stats=None, global_threshold=None):
+    """Grayscale page -> binary image with text = 255, background = 0.
+
+    method:
+        "otsu"    one global Otsu threshold (cv2.threshold, the original path)
+        "tiled"   Otsu per tile over the histogram of its neighbour tiles,
+                  bilinearly interpolated between tile centers; tiles
+                  without text take the threshold of their neighbours
+        "sauvola" Sauvola's local threshold from integral images
+    ``stats`` (a PageStats of ``gray``) is reused between calls on the same
+    page; ``global_threshold`` overrides the page's own Otsu value (e.g. for
+    bands of one page).
+    """
+    if method not in BINARIZERS:
+        raise ValueError(f"unknown binarization method {method!r}, use one of {BINARIZERS}")
+    if method == "otsu":
+        if global_threshold is not None:
+            return cv2.threshold(gray, global_threshold, 255, cv2.THRESH_BINARY_INV)[1]
+        return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+
+    stats = stats if stats is not None else PageStats(gray)
+    if method == "tiled":
+        grid = stats.tile_thresholds(global_threshold=global_threshold)
+        ty, tx = grid.shape
+        h, w = gray.shape
+        full = cv2.resize(grid, (tx * stats.tile, ty * stats.tile),
+                          interpolation=cv2.INTER_LINEAR)
+        return _ink_below(gray, full[:h, :w])
+
+    mean, std = stats.local_mean_std()
+    # T = mean * (1 + k * (std / R - 1)), in one new float32 array
+    t = std * np.float32(SAUVOLA_K / SAUVOLA_R)
+    t += np.float32(1.0 - SAUVOLA_K)
+    t *= mean
+    return _ink_below(gray, t)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare binarization methods on a page: time, components and noise")
+    parser.add_argument('image', nargs='?', default="sentence_image.png")
+    parser.add_argument('--min-width', type=int, default=2)
+    parser.add_argument('--min-height', type=int, default=10)
+    parser.add_argument('--save', metavar='PREFIX',
+                        help='Write every binary page to PREFIX-<method>.png')
+    args = parser.parse_args()
+
+    gray = cv2.imread(args.image, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        print(f"Error: ไม่พบไฟล์ '{args.image}'")
+        return 1
+    print(f"page {gray.shape[1]}x{gray.shape[0]}")
+
+    stats = PageStats(gray)
+    for method in BINARIZERS:
+        t0 = time.perf_counter()
+        thresh = binarize(gray, method, stats)
+        dt = time.perf_counter() - t0
+        boxes = cv2.connectedComponentsWithStats(thresh, connectivity=8)[2][1:, :4]
+        noise = int(((boxes[:, 2] < args.min_width) | (boxes[:, 3] < args.min_height)).sum())
+        print(f"{method:<8} {dt * 1000:8.1f} ms  {len(boxes):>7} components  "
+              f"{noise:>7} noise")
+        if args.save:
+            cv2.imwrite(f"{args.save}-{method}.png", thresh)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
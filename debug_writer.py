@@ -0,0 +1,151 @@
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+import numpy as np
+
+# --- การตั้งค่าเริ่มต้น ---
+DEBUG_DIR = "debug_rois"
+DEBUG_SAMPLE = 1.0       # สัดส่วน glyph ที่ไม่ผ่าน threshold ที่จะเก็บ
+DEBUG_RATE = 200.0       # glyph ต่อวินาทีสูงสุด (token bucket)
+DEBUG_MAX_GLYPHS = 256   # glyph สูงสุดต่อหน้า
+DEBUG_QUEUE_SIZE = 64    # หน้าที่รอเขียนได้ เกินนี้ถูกทิ้ง (ไม่ทำให้งาน OCR ช้าลง)
+
+
+class DebugWriter:
+    """Saves low-confidence glyphs from a background thread.
+
+    submit() does the sampling and rate limiting, copies the few selected
+    crops and puts them on a bounded queue; it never blocks and never
+    touches the disk. When the queue is full the page is dropped and
+    counted in ``stats``. The thread writes one archive per page:
+
+        <name>.npz  - crops (flat) + crop_shapes, rois (normalized), templates
+        <name>.json - page, glyph ids, boxes, best chars and scores
+
+    Names are ``<page>-<pid>-<seq>`` so concurrent processes never collide;
+    glyph ids are ``<name>/<index on the page>``. ``out_dir`` is created
+    on the first write, so a run without rejected glyphs leaves no folder.
+    """
+
+    def __init__(self, out_dir=DEBUG_DIR, bank=None, sample=DEBUG_SAMPLE, rate=DEBUG_RATE,
+                 max_glyphs=DEBUG_MAX_GLYPHS, queue_size=DEBUG_QUEUE_SIZE, seed=None):
+        self.out_dir = out_dir
+        self.bank = bank
+        self.sample = sample
+        self.rate = rate
+        self.max_glyphs = max_glyphs
+        self.stats = {"pages": 0, "glyphs": 0, "sampled_out": 0, "rate_limited": 0,
+                      "dropped": 0, "errors": 0}
+        self._random = random.Random(seed)
+        self._tokens = float(max(1.0, rate))
+        self._last = time.monotonic()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="ocr-debug-writer", daemon=True)
+        self._thread.start()
+
+    def _take_tokens(self, wanted):
+        """Glyphs allowed right now by the rate limit (token bucket)."""
+        now = time.monotonic()
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        allowed = min(wanted, int(self._tokens))
+        self._tokens -= allowed
+        return allowed
+
+    def submit(self, thresh, boxes, rois, chars, scores, indices, page="page"):
+        """Queue glyphs ``indices`` of one page (boxes/rois/chars/scores are
+        for the whole page). Returns the number of glyphs queued."""
+        with self._lock:
+            picked = [int(i) for i in indices if self._random.random() < self.sample]
+            self.stats["sampled_out"] += len(indices) - len(picked)
+            picked = picked[:self.max_glyphs]
+            allowed = self._take_tokens(len(picked))
+            self.stats["rate_limited"] += len(picked) - allowed
+            picked = picked[:allowed]
+        if not picked:
+            return 0
+
+        # copy only the selected crops so the page itself is not kept alive
+        crops = [np.array(thresh[y:y+h, x:x+w]) for x, y, w, h in
+                 (boxes[i] for i in picked)]
+        item = {"page": str(page), "index": picked,
+                "boxes": [list(map(int, boxes[i])) for i in picked],
+                "chars": [chars[i] for i in picked],
+                "scores": [float(scores[i]) for i in picked],
+                "crops": crops, "rois": np.asarray(rois)[picked]}
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += len(picked)
+            return 0
+        return len(picked)
+
+    def _write(self, item):
+        stem = os.path.splitext(os.path.basename(item["page"]))[0] or "page"
+        name = f"{stem}-{os.getpid()}-{next(self._seq):06d}"
+        path = os.path.join(self.out_dir, name)
+        os.makedirs(self.out_dir, exist_ok=True)
+
+        arrays = {"crops": np.concatenate([c.ravel() for c in item["crops"]]),
+                  "crop_shapes": np.array([c.shape for c in item["crops"]], dtype=np.int32),
+                  "rois": item["rois"]}
+        if self.bank is not None and len(self.bank):
+            arrays["templates"] = np.stack([
+                self.bank[c] if c in self.bank.labels else np.zeros_like(item["rois"][0])
+                for c in item["chars"]])
+        np.savez_compressed(path + ".npz", **arrays)
+
+        meta = {"page": item["page"], "time": time.time(),
+                "glyphs": [{"id": f"{name}/{i}", "box": box, "char": char, "score": score}
+                           for i, box, char, score in zip(item["index"], item["boxes"],
+                                                          item["chars"], item["scores"])]}
+        with open(path + ".json", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write(item)
+                with self._lock:
+                    self.stats["pages"] += 1
+                    self.stats["glyphs"] += len(item["index"])
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                print(f"ไม่สามารถบันทึก debug ROI: {e}")
+
+    def close(self):
+        """Write everything still queued and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+def load_page(path):
+    """Read an archive written by DebugWriter back as a list of dicts
+    (metadata + "crop", "roi" and "template" arrays per glyph)."""
+    base = os.path.splitext(path)[0]
+    with open(base + ".json", encoding='utf-8') as f:
+        meta = json.load(f)
+    with np.load(base + ".npz") as data:
+        sizes = np.prod(data["crop_shapes"], axis=1)
+        crops = np.split(data["crops"], np.cumsum(sizes)[:-1])
+        glyphs = []
+        for i, glyph in enumerate(meta["glyphs"]):
+            glyph = dict(glyph, crop=crops[i].reshape(data["crop_shapes"][i]),
+                         roi=data["rois"][i])
+            if "templates" in data:
+                glyph["template"] = data["templates"][i]
+            glyphs.append(glyph)
+    return glyphs
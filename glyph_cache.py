@@ -0,0 +1,173 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+GLYPH_CACHE_SIZE = 50000
+# perceptual key: the glyph reduced by PERCEPTUAL_BLOCK x PERCEPTUAL_BLOCK blocks,
+# a block counts as ink when at least half of it is ink
+PERCEPTUAL_BLOCK = 2
+
+
+def exact_keys(rois):
+    """Packed binary bitmap of every ROI (ink = value > 127), one bytes key each."""
+    rois = np.asarray(rois)
+    packed = np.packbits((rois > 127).reshape(len(rois), -1), axis=1)
+    return [b"e" + row.tobytes() for row in packed]
+
+
+def perceptual_keys(rois):
+    """Coarser key that is the same for glyphs differing by a few pixels."""
+    rois = np.asarray(rois)
+    n, h, w = rois.shape
+    b = PERCEPTUAL_BLOCK
+    ink = (rois[:, :h - h % b, :w - w % b] > 127).astype(np.uint8)
+    blocks = ink.reshape(n, h // b, b, w // b, b).sum(axis=(2, 4))
+    packed = np.packbits((blocks * 2 >= b * b).reshape(n, -1), axis=1)
+    return [b"p" + row.tobytes() for row in packed]
+
+
+class GlyphCache:
+    """LRU cache of (char, score) per normalized glyph bitmap, optionally
+    with the top-K (chars, scores) of the glyph.
+
+    Keys are the packed 1-bit bitmaps of the ROIs (exact) and, with
+    ``perceptual=True``, a block-reduced bitmap as a fallback for
+    near-duplicates. ``stats`` counts hits, near-hits and misses.
+
+    With ``path`` the cache is loaded from / saved to an .npz file. The file
+    remembers the template bank it was built with (``bank_id``) and is
+    ignored if the bank changed.
+    """
+
+    def __init__(self, capacity=GLYPH_CACHE_SIZE, perceptual=False, path=None, bank_id=""):
+        self.capacity = capacity
+        self.perceptual = perceptual
+        self.path = path
+        self.bank_id = bank_id
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0}
+        self._entries = OrderedDict()  # key -> (char, score, top or None)
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, rois):
+        """Look up a (N, H, W) batch.
+
+        Returns (keys, chars, scores, tops, missing): chars has None and
+        scores NaN for misses, tops the stored (top_chars, top_scores) or
+        None; ``missing`` are the indices that still need to be matched.
+        Pass ``keys`` back to store().
+        """
+        keys = exact_keys(rois)
+        near = perceptual_keys(rois) if self.perceptual else [None] * len(keys)
+        chars = [None] * len(keys)
+        scores = np.full(len(keys), np.nan, dtype=np.float32)
+        tops = [None] * len(keys)
+        missing = []
+
+        with self._lock:
+            for i, (key, pkey) in enumerate(zip(keys, near)):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                elif pkey is not None and pkey in self._entries:
+                    entry = self._entries[pkey]
+                    self._entries.move_to_end(pkey)
+                    self.stats["near_hits"] += 1
+                else:
+                    missing.append(i)
+                    self.stats["misses"] += 1
+                    continue
+                chars[i], scores[i], tops[i] = entry
+        return (keys, near), chars, scores, tops, np.array(missing, dtype=np.int64)
+
+    def store(self, keys, indices, chars, scores, tops=None):
+        """Remember the matches of ``indices`` (as returned by lookup()),
+        with their (top_chars, top_scores) if given."""
+        keys, near = keys
+        tops = tops if tops is not None else [None] * len(indices)
+        with self._lock:
+            for i, char, score, top in zip(indices, chars, scores, tops):
+                entry = (char, float(score), top)
+                self._entries[keys[i]] = entry
+                self._entries.move_to_end(keys[i])
+                if near[i] is not None:
+                    self._entries[near[i]] = entry
+                    self._entries.move_to_end(near[i])
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def load(self, path):
+        """Add the entries of a saved cache (if it was built with the same bank)."""
+        try:
+            with np.load(path) as data:
+                if str(data["bank_id"][()]) != self.bank_id:
+                    return 0
+                groups = []
+                for kind, prefix in (("exact", b"e"), ("near", b"p")):
+                    flat = data[f"{kind}_keys"].tobytes()
+                    ends = np.cumsum(data[f"{kind}_lengths"]).tolist()
+                    keys = [flat[a:b] for a, b in zip([0] + ends[:-1], ends)]
+                    tops = [None] * len(keys)
+                    if f"{kind}_top_chars" in data:
+                        tops = list(zip(data[f"{kind}_top_chars"].tolist(),
+                                        data[f"{kind}_top_scores"]))
+                    groups.append((keys, data[f"{kind}_chars"], data[f"{kind}_scores"], tops,
+                                   prefix))
+        except Exception as e:
+            print(f"คำเตือน: ไม่สามารถอ่าน glyph cache {path}: {e}")
+            return 0
+
+        count = 0
+        with self._lock:
+            for keys, chars, scores, tops, prefix in groups:
+                for key, char, score, top in zip(keys, chars, scores, tops):
+                    key = prefix + key
+                    if key not in self._entries:
+                        # loaded entries count as the least recently used ones
+                        self._entries[key] = (str(char), float(score), top)
+                        self._entries.move_to_end(key, last=False)
+                        count += 1
+        return count
+
+    def save(self, path=None):
+        """Write the cache to ``path`` (default: the path given at init).
+
+        Entries already in the file are kept (this cache wins on conflicts),
+        so worker processes sharing one file add to it instead of replacing
+        it. The write is atomic.
+        """
+        path = path or self.path
+        if not path:
+            return
+        if os.path.exists(path):
+            self.load(path)
+
+        with self._lock:
+            items = list(self._entries.items())[-self.capacity:]
+        # exact ("e...") and perceptual ("p...") keys are stored without the
+        # prefix as one flat uint8 array + key lengths (a template pyramid
+        # gives keys of several sizes)
+        arrays = {"bank_id": np.array(self.bank_id)}
+        for kind, prefix in (("exact", b"e"), ("near", b"p")):
+            group = [(k[1:], v) for k, v in items if k[:1] == prefix]
+            arrays[f"{kind}_keys"] = np.frombuffer(b"".join(k for k, _ in group), dtype=np.uint8)
+            arrays[f"{kind}_lengths"] = np.array([len(k) for k, _ in group], dtype=np.int32)
+            arrays[f"{kind}_chars"] = np.array([v[0] for _, v in group], dtype=str)
+            arrays[f"{kind}_scores"] = np.array([v[1] for _, v in group], dtype=np.float32)
+            if group and group[0][1][2] is not None:
+                # top-K caches (the bank_id includes K, so all rows have K columns)
+                arrays[f"{kind}_top_chars"] = np.array([v[2][0] for _, v in group], dtype=str)
+                arrays[f"{kind}_top_scores"] = np.array([v[2][1] for _, v in group],
+                                                        dtype=np.float32)
+
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
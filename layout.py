@@ -0,0 +1,147 @@
+import numpy as np
+
+# tolerance ของการจัดแถว: max(ROW_TOLERANCE_MIN, ความสูงเฉลี่ย * ROW_TOLERANCE_FACTOR)
+ROW_TOLERANCE_MIN = 10
+ROW_TOLERANCE_FACTOR = 0.5
+# ช่องว่างระหว่างคำ: gap > max(WORD_GAP_LETTER_FACTOR * gap ระหว่างตัวอักษร,
+#                              WORD_GAP_HEIGHT_FACTOR * ความสูงกลาง)
+WORD_GAP_LETTER_FACTOR = 2.0
+WORD_GAP_HEIGHT_FACTOR = 0.3
+# ความสูงตัวอักษรของบรรทัด = percentile นี้ของความสูง box ในบรรทัด (ไม่นับตัวเล็ก/จุด)
+LINE_HEIGHT_PERCENTILE = 75
+
+
+def as_boxes(boxes):
+    """Any sequence of (x, y, w, h) -> int array of shape (N, 4)."""
+    boxes = np.asarray(boxes, dtype=np.int64)
+    return boxes.reshape(-1, 4)
+
+
+def row_tolerance(boxes):
+    """Largest y-center distance (px) between neighbouring boxes of a row."""
+    return max(ROW_TOLERANCE_MIN, as_boxes(boxes)[:, 3].mean() * ROW_TOLERANCE_FACTOR)
+
+
+def row_ids(boxes, tolerance=None):
+    """Row number (0 = top) of every box.
+
+    Boxes are sorted once by y-center and a new row starts wherever two
+    consecutive centers are more than the tolerance apart (row_tolerance()
+    of ``boxes`` if None). Because each box is compared with its neighbour
+    rather than with the first box of the row, slightly skewed lines stay
+    in one row.
+    """
+    boxes = as_boxes(boxes)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    cy = boxes[:, 1] + boxes[:, 3] / 2.0
+    tol = row_tolerance(boxes) if tolerance is None else tolerance
+
+    order = np.argsort(cy, kind='stable')
+    new_row = np.concatenate([[False], np.diff(cy[order]) > tol])
+    ids = np.empty(len(boxes), dtype=np.int64)
+    ids[order] = np.cumsum(new_row)
+    return ids
+
+
+def reading_order(boxes, tolerance=None):
+    """Indices that put boxes in reading order (rows top-to-bottom, then x).
+
+    Returns (order, rows) where rows is the row number of each box in
+    ``order`` (non-decreasing).
+    """
+    boxes = as_boxes(boxes)
+    ids = row_ids(boxes, tolerance)
+    order = np.lexsort((boxes[:, 0], ids))
+    return order, ids[order]
+
+
+def split_rows(order, rows):
+    """Split reading-order indices into one index array per row."""
+    if len(order) == 0:
+        return []
+    starts = np.flatnonzero(np.diff(rows)) + 1
+    return np.split(order, starts)
+
+
+def line_heights(boxes):
+    """Typical glyph height of the line each box belongs to (float array,
+    one value per box): the LINE_HEIGHT_PERCENTILE of the box heights of
+    the row, so x-height letters and punctuation do not pull it down."""
+    boxes = as_boxes(boxes)
+    heights = np.zeros(len(boxes))
+    order, rows = reading_order(boxes)
+    for idx in split_rows(order, rows):
+        heights[idx] = np.percentile(boxes[idx, 3], LINE_HEIGHT_PERCENTILE)
+    return heights
+
+
+def row_gaps(boxes, order, rows):
+    """Horizontal gap between each box of ``order`` and the previous one, and
+    whether the two are on the same row. Both arrays have len(order) - 1."""
+    b = as_boxes(boxes)[order]
+    gaps = b[1:, 0] - (b[:-1, 0] + b[:-1, 2])
+    return gaps, rows[1:] == rows[:-1]
+
+
+def word_gap_threshold(letter_gap, median_height):
+    """Gap (px) above which two neighbouring glyphs belong to different words."""
+    return max(WORD_GAP_LETTER_FACTOR * max(0.0, letter_gap),
+               WORD_GAP_HEIGHT_FACTOR * median_height)
+
+
+def estimate_word_gap(boxes, order, rows):
+    """word_gap_threshold() from the statistics of ``boxes``: the typical
+    letter gap (25th percentile of the gaps within rows) and the median
+    glyph height."""
+    boxes = as_boxes(boxes)
+    gaps, same_row = row_gaps(boxes, order, rows)
+    letter_gap = np.percentile(gaps[same_row], 25) if same_row.any() else 0.0
+    return word_gap_threshold(letter_gap, np.median(boxes[order, 3]))
+
+
+def word_breaks(boxes, order, rows, threshold=None):
+    """Boolean array: True where a space goes before ``order[i]``.
+
+    The horizontal gap to the previous box of the same row is compared with
+    ``threshold``; by default it comes from the page statistics
+    (estimate_word_gap()).
+    """
+    boxes = as_boxes(boxes)
+    breaks = np.zeros(len(order), dtype=bool)
+    if len(order) < 2:
+        return breaks
+
+    gaps, same_row = row_gaps(boxes, order, rows)
+    if not same_row.any():
+        return breaks
+
+    if threshold is None:
+        threshold = estimate_word_gap(boxes, order, rows)
+    breaks[1:] = same_row & (gaps > threshold)
+    return breaks
+
+
+def group_lines(boxes, chars, word_gap=None):
+    """Group recognized chars into lines.
+
+    Returns (rows, lines): rows are the chars of each line joined without
+    spaces (same as before), lines have a space at every word boundary
+    (gaps wider than ``word_gap``, estimated from the boxes if None).
+    """
+    boxes = as_boxes(boxes)
+    if len(boxes) == 0:
+        return [], []
+
+    order, rows = reading_order(boxes)
+    breaks = word_breaks(boxes, order, rows, word_gap)
+    chars = np.asarray(chars, dtype=object)
+
+    row_strings, line_strings = [], []
+    for idx, brk in zip(split_rows(order, rows), split_rows(breaks, rows)):
+        row_chars = chars[idx]
+        row_strings.append(''.join(row_chars))
+        line_strings.append(''.join(
+            (' ' + c) if b else c for c, b in zip(row_chars, brk)))
+    return row_strings, line_strings
@@ -0,0 +1,176 @@
+import contextlib
+import json
+import threading
+import time
+
+import numpy as np
+
+# bucket upper bounds (Prometheus "le"), +Inf is implicit
+GLYPHS_PER_PAGE_BUCKETS = (0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+GLYPH_LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2)
+SCORE_BUCKETS = tuple(np.round(np.arange(0.0, 1.01, 0.1), 1).tolist())
+NOISE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+HISTOGRAMS = {
+    "glyphs_per_page": GLYPHS_PER_PAGE_BUCKETS,
+    "glyph_latency_seconds": GLYPH_LATENCY_BUCKETS,
+    "best_score": SCORE_BUCKETS,
+    "noise_components_per_page": NOISE_BUCKETS,
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``counts[i]`` counts values <= buckets[i]
+    (and above the previous bound), the last slot is +Inf."""
+
+    def __init__(self, buckets):
+        self.buckets = np.asarray(buckets, dtype=np.float64)
+        self.counts = np.zeros(len(buckets) + 1, dtype=np.int64)
+        self.sum = 0.0
+
+    def observe(self, values, weight=1):
+        """Add one value or an array of values (each counted ``weight`` times)."""
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        if len(values) == 0:
+            return
+        slots = np.searchsorted(self.buckets, values, side='left')
+        self.counts += weight * np.bincount(slots, minlength=len(self.counts))
+        self.sum += weight * float(values.sum())
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def to_dict(self):
+        return {"buckets": self.buckets.tolist(), "counts": self.counts.tolist(),
+                "count": self.count, "sum": self.sum}
+
+    def merge(self, data):
+        self.counts += np.asarray(data["counts"], dtype=np.int64)
+        self.sum += data["sum"]
+
+
+def timed(metrics, stage):
+    """``with timed(metrics, "segment"):`` times the block if metrics is not None."""
+    if metrics is None:
+        return contextlib.nullcontext()
+    return metrics.stage(stage)
+
+
+class Metrics:
+    """Counters, per-stage timers and histograms of the OCR pipeline.
+
+    Thread-safe (the OCR service shares one instance between its worker
+    threads). Export with to_dict()/to_json() or to_prometheus().
+    """
+
+    def __init__(self, prefix="ocr"):
+        self.prefix = prefix
+        self.counters = {}
+        self.timers = {}  # stage -> [calls, seconds]
+        self.histograms = {name: Histogram(b) for name, b in HISTOGRAMS.items()}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, stage, seconds, calls=1):
+        with self._lock:
+            timer = self.timers.setdefault(stage, [0, 0.0])
+            timer[0] += calls
+            timer[1] += seconds
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def observe(self, name, values, weight=1):
+        with self._lock:
+            self.histograms[name].observe(values, weight)
+
+    def observe_page(self, glyphs, scores, seconds):
+        """Page-level statistics: glyph count, best scores and the per-glyph
+        latency (``seconds`` spread over the glyphs of the page)."""
+        self.count("pages")
+        self.count("glyphs", glyphs)
+        self.observe("glyphs_per_page", glyphs)
+        self.observe("best_score", scores)
+        if glyphs:
+            self.observe("glyph_latency_seconds", seconds / glyphs, weight=glyphs)
+
+    def to_dict(self):
+        with self._lock:
+            return {"counters": dict(self.counters),
+                    "stages": {s: {"calls": c, "seconds": t} for s, (c, t) in self.timers.items()},
+                    "histograms": {n: h.to_dict() for n, h in self.histograms.items()}}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def snapshot(self, reset=False):
+        """to_dict(), optionally clearing everything (for merging elsewhere)."""
+        data = self.to_dict()
+        if reset:
+            with self._lock:
+                self.counters.clear()
+                self.timers.clear()
+                self.histograms = {name: Histogram(b) for name, b in HISTOGRAMS.items()}
+        return data
+
+    def merge(self, data):
+        """Add a to_dict()/snapshot() of another instance (e.g. a worker process)."""
+        with self._lock:
+            for name, value in data["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for stage, st in data["stages"].items():
+                timer = self.timers.setdefault(stage, [0, 0.0])
+                timer[0] += st["calls"]
+                timer[1] += st["seconds"]
+            for name, hist in data["histograms"].items():
+                self.histograms[name].merge(hist)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format."""
+        data = self.to_dict()
+        p = self.prefix
+        out = []
+        for name, value in sorted(data["counters"].items()):
+            out.append(f"# TYPE {p}_{name}_total counter")
+            out.append(f"{p}_{name}_total {value}")
+
+        out.append(f"# TYPE {p}_stage_seconds_total counter")
+        for stage, st in data["stages"].items():
+            out.append(f'{p}_stage_seconds_total{{stage="{stage}"}} {st["seconds"]:.9g}')
+        out.append(f"# TYPE {p}_stage_calls_total counter")
+        for stage, st in data["stages"].items():
+            out.append(f'{p}_stage_calls_total{{stage="{stage}"}} {st["calls"]}')
+
+        for name, hist in data["histograms"].items():
+            out.append(f"# TYPE {p}_{name} histogram")
+            cumulative = np.cumsum(hist["counts"])
+            for le, c in zip(hist["buckets"] + ["+Inf"], cumulative):
+                out.append(f'{p}_{name}_bucket{{le="{le}"}} {c}')
+            out.append(f"{p}_{name}_sum {hist['sum']:.9g}")
+            out.append(f"{p}_{name}_count {hist['count']}")
+        return "\n".join(out) + "\n"
+
+    def save(self, path):
+        """Write to ``path``: Prometheus text for *.prom, JSON otherwise."""
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def report(self):
+        """Short human-readable summary of the stage timers."""
+        data = self.to_dict()
+        total = sum(st["seconds"] for st in data["stages"].values()) or 1.0
+        lines = [f"{'stage':<10} {'calls':>7} {'total ms':>10} {'share':>7}"]
+        for stage, st in sorted(data["stages"].items(), key=lambda kv: -kv[1]["seconds"]):
+            lines.append(f"{stage:<10} {st['calls']:>7} {1000 * st['seconds']:>10.2f} "
+                         f"{st['seconds'] / total:>7.1%}")
+        return "\n".join(lines)
@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+
+
+def tight_crop(roi):
+    """Crop a binary ROI (foreground > 0) to the bounding box of its ink.
+
+    Boxes from segmentation already touch ink on all four sides, so that is
+    checked first with four cv2.countNonZero calls on views; only otherwise
+    are the row/column projections (cv2.reduce) computed. Returns a view.
+    """
+    if (cv2.countNonZero(roi[:1]) and cv2.countNonZero(roi[-1:])
+            and cv2.countNonZero(roi[:, :1]) and cv2.countNonZero(roi[:, -1:])):
+        return roi
+
+    rows = np.flatnonzero(cv2.reduce(roi, 1, cv2.REDUCE_MAX))
+    if len(rows) == 0:
+        return roi  # no ink at all: keep the ROI as it is
+    cols = np.flatnonzero(cv2.reduce(roi, 0, cv2.REDUCE_MAX))
+    return roi[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+
+def normalize_into(roi, canvas):
+    """Write ``roi`` into the zeroed ``canvas`` (H, W): tight crop, resize
+    keeping the aspect ratio (INTER_AREA) and center. cv2.resize writes
+    straight into the canvas view, nothing else is allocated.
+    """
+    height, width = canvas.shape
+    h, w = roi.shape[:2]
+    if h == 0 or w == 0:
+        return canvas
+
+    roi = tight_crop(roi)
+    h, w = roi.shape[:2]
+
+    # compute scaling while maintaining aspect ratio
+    scale = min(width / w, height / h)
+    new_w = max(1, int(w * scale))
+    new_h = max(1, int(h * scale))
+    x_off = (width - new_w) // 2
+    y_off = (height - new_h) // 2
+    cv2.resize(roi, (new_w, new_h), dst=canvas[y_off:y_off+new_h, x_off:x_off+new_w],
+               interpolation=cv2.INTER_AREA)
+    return canvas
+
+
+def normalize_boxes(thresh, boxes, width, height, out=None):
+    """Normalize every box of a binary page into one (N, height, width) uint8
+    tensor, ready for TemplateBank.match().
+
+    ``out`` may be a preallocated buffer with at least N glyphs; it is
+    zeroed and filled in place (the returned array is ``out[:N]``).
+    """
+    n = len(boxes)
+    if out is None:
+        out = np.zeros((n, height, width), dtype=np.uint8)
+    else:
+        out = out[:n]
+        out.fill(0)
+
+    for canvas, (x, y, w, h) in zip(out, np.asarray(boxes).reshape(-1, 4).tolist()):
+        normalize_into(thresh[y:y+h, x:x+w], canvas)
+    return out
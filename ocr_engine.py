@@ -0,0 +1,557 @@
+import argparse
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from binarization import PageStats, binarize
+import layout
+from debug_writer import DEBUG_RATE, DEBUG_SAMPLE, DebugWriter
+from glyph_cache import GlyphCache
+from metrics import Metrics, timed
+from normalize import normalize_boxes, normalize_into
+import segmentation
+import splitting
+from template_bank import TemplateBank
+
+# --- การตั้งค่า ---
+# ถ้ามีเทมเพลตแยกโฟลเดอร์ตามชนิด ให้ใส่ชื่อโฟลเดอร์เหล่านั้นไว้ในลิสต์นี้
+TEMPLATE_DIRS = ["Digits_templates", "Lowercase_templates", "Uppercase_templates"]
+TEMPLATE_WIDTH = 30
+TEMPLATE_HEIGHT = 30
+MATCH_THRESHOLD = 0.6  # ค่าความมั่นใจ (0.0 - 1.0) ยิ่งสูงยิ่งเข้มงวด — ปรับลดเล็กน้อยเมื่อใช้คะแนนเฉลี่ย
+MIN_CHAR_WIDTH = 2    # กรอง contours ที่เล็กเกินไป (อาจเป็นจุดรบกวน)
+MIN_CHAR_HEIGHT = 10
+
+TEMPLATE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_template_dirs():
+    """TEMPLATE_DIRS resolved next to this file, so the engine works from any cwd."""
+    return [os.path.join(BASE_DIR, d) for d in TEMPLATE_DIRS]
+
+
+def prepare_template(template_img, width=TEMPLATE_WIDTH, height=TEMPLATE_HEIGHT):
+    """Grayscale template image (dark glyph on light background) -> binary
+    template with foreground = 255, resized to (width, height)."""
+    # Normalize: binarize and invert so foreground is white (255) like ROI
+    try:
+        _, template_bin = cv2.threshold(template_img, 0, 255,
+                                        cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    except Exception:
+        # fallback: simple threshold
+        _, template_bin = cv2.threshold(template_img, 127, 255, cv2.THRESH_BINARY)
+
+    # Resize to match matcher size
+    return cv2.resize(template_bin, (width, height))
+
+
+def read_template_images(template_dirs):
+    """Read every template file of the folder(s) as grayscale, {name: image}."""
+    images = {}
+
+    # allow passing a single folder as string
+    if isinstance(template_dirs, str):
+        template_dirs = [template_dirs]
+
+    for tdir in template_dirs:
+        if not os.path.isdir(tdir):
+            print(f"คำเตือน: ไม่พบโฟลเดอร์เทมเพลตที่ {tdir}")
+            continue
+
+        for fname in os.listdir(tdir):
+            name, ext = os.path.splitext(fname)
+            if ext.lower() not in TEMPLATE_EXTS:
+                continue
+
+            path = os.path.join(tdir, fname)
+            template_img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if template_img is None:
+                print(f"คำเตือน: ไม่สามารถโหลดเทมเพลตที่ {path}")
+                continue
+            images[name] = template_img
+    return images
+
+
+def load_templates(template_dirs, width=TEMPLATE_WIDTH, height=TEMPLATE_HEIGHT,
+                   verbose=True):
+    """โหลดเทมเพลตทั้งหมดจากโฟลเดอร์/หลายโฟลเดอร์มาเก็บใน Dictionary
+
+    template_dirs can be a string (single folder) or a list of folders.
+    Files with extensions .png/.jpg/.jpeg/.bmp/.tif/.tiff will be loaded.
+    Each template is converted to binary (inverted so foreground = 255) and
+    resized to (width, height) for matching.
+    """
+    if verbose:
+        print("กำลังโหลดเทมเพลต...")
+    templates = {}
+    for name, template_img in read_template_images(template_dirs).items():
+        try:
+            templates[name] = prepare_template(template_img, width, height)
+        except Exception as e:
+            print(f"คำเตือน: ไม่สามารถปรับขนาดเทมเพลต {name}: {e}")
+
+    if verbose:
+        print(f"โหลดเทมเพลตสำเร็จ {len(templates)} ตัว จาก {template_dirs}")
+    return templates
+
+
+def parse_scales(spec, minimum=TEMPLATE_HEIGHT):
+    """"30,48,64" -> (30, 48, 64) (for --scales). Sizes below ``minimum``
+    (the base template size) are rejected: lines are never matched below it."""
+    scales = tuple(int(v) for v in spec.replace(' ', '').split(',') if v)
+    small = [sc for sc in scales if sc < minimum]
+    if small:
+        raise argparse.ArgumentTypeError(
+            f"scales below the {minimum}px base template size are never used: {small}")
+    return scales
+
+
+def load_pyramid(template_dirs, scales, template_cache=None, verbose=True):
+    """One TemplateBank per scale (square ``s`` x ``s`` templates), built
+    from the template files read once. With ``template_cache`` every scale
+    is compiled to its own file (``templates-24.npz`` ...)."""
+    if template_cache:
+        from template_cache import load_or_compile
+        root, ext = os.path.splitext(template_cache)
+        return {s: load_or_compile(template_dirs, f"{root}-{s}{ext}", s, s, verbose=verbose)
+                for s in scales}
+
+    images = read_template_images(template_dirs)
+    pyramid = {s: TemplateBank.from_dict({name: prepare_template(img, s, s)
+                                          for name, img in images.items()})
+               for s in scales}
+    if verbose:
+        print(f"โหลดเทมเพลตสำเร็จ {len(images)} ตัว x {len(scales)} ขนาด {list(scales)} "
+              f"จาก {template_dirs}")
+    return pyramid
+
+
+def compile_template_cache(template_dirs, template_cache, width=TEMPLATE_WIDTH,
+                           height=TEMPLATE_HEIGHT, scales=None):
+    """Compile (if needed) the cache file(s) an OCREngine with the same
+    settings will load, e.g. once before starting worker processes."""
+    if scales:
+        load_pyramid(template_dirs, tuple(sorted(set(scales))), template_cache, verbose=False)
+    else:
+        from template_cache import load_or_compile
+        load_or_compile(template_dirs, template_cache, width, height)
+
+
+def sort_contours(contours):
+    """
+    จัดเรียง Contours แบบรองรับหลายบรรทัด: แบ่งเป็น "rows" ตามค่า y-center
+    แล้วเรียงแต่ละแถวจากซ้ายไปขวา (ดู layout.reading_order)
+    """
+    if not contours:
+        return contours
+
+    boxes = [cv2.boundingRect(c) for c in contours]
+    order, _ = layout.reading_order(boxes)
+    return [contours[i] for i in order]
+
+
+def prepare_roi_for_matching(roi, width=TEMPLATE_WIDTH, height=TEMPLATE_HEIGHT):
+    """Resize ROI to template size while preserving aspect ratio by padding.
+
+    Input roi should be binary with foreground=255.
+    """
+    return normalize_into(roi, np.zeros((height, width), dtype=np.uint8))
+
+
+def group_chars_into_lines(detected_list):
+    """Group detected characters into rows based on y-center (baseline) and
+    sort each row left-to-right.
+
+    detected_list: list of tuples (x, y, w, h, char)
+    Returns list of strings (one string per row), ordered top-to-bottom.
+    """
+    if not detected_list:
+        return []
+
+    boxes = [item[:4] for item in detected_list]
+    chars = [item[4] for item in detected_list]
+    return layout.group_lines(boxes, chars)[0]
+
+
+class OCREngine:
+    """Template-matching OCR with the templates loaded once.
+
+    Construct it once (e.g. per worker process) and call recognize() for
+    every image; nothing is read from disk after __init__. With
+    ``template_cache="templates.npz"`` the bank is memory-mapped from a
+    compiled file (see template_cache.py) instead of decoding the PNGs.
+    ``prune_k=K`` enables two-stage matching for large template sets;
+    with ``prune_check=True`` the exhaustive match is run as well and the
+    disagreements are counted for the whole run in ``prune_stats`` and the
+    metrics (not per page: the service matches glyphs of several requests
+    together). ``glyph_cache_size=N``
+    puts an LRU cache keyed by the glyph bitmap in front of the matcher
+    (optionally persisted to ``glyph_cache_file``, see glyph_cache.py).
+    ``metrics`` (a metrics.Metrics, or True for a new one) times every
+    stage and records per-page histograms. ``debug_dir`` saves glyphs below
+    the threshold from a background thread (see debug_writer.py); call
+    close() when done so queued pages are written. ``scales=(30, 48, 64)``
+    builds a template pyramid at load time and matches every line at the
+    scale closest to its glyph height. ``binarizer`` picks the page
+    threshold: "otsu" (global), "tiled" or "sauvola" for uneven lighting
+    (see binarization.py). ``top_k=K`` adds the K best distinct
+    chars of every glyph with their scores to the result (see assemble()).
+    ``split_touching=True`` cuts over-wide blobs of touching glyphs at
+    projection minima when a split matches better (see splitting.py).
+
+        engine = OCREngine()
+        result = engine.recognize(cv2.imread("page.png"))
+        print(result["text"])
+    """
+
+    def __init__(self, template_dirs=None, width=TEMPLATE_WIDTH, height=TEMPLATE_HEIGHT,
+                 match_threshold=MATCH_THRESHOLD, min_char_width=MIN_CHAR_WIDTH,
+                 min_char_height=MIN_CHAR_HEIGHT, template_cache=None, prune_k=None,
+                 prune_check=False, segmenter="contours", merge_parts=False,
+                 glyph_cache_size=0, glyph_cache_file=None, glyph_cache_perceptual=False,
+                 metrics=None, debug_dir=None, debug_sample=DEBUG_SAMPLE,
+                 debug_rate=DEBUG_RATE, scales=None, top_k=1, binarizer="otsu",
+                 split_touching=False, verbose=False):
+        if template_dirs is None:
+            template_dirs = default_template_dirs()
+        self.template_dirs = template_dirs
+        self.width = width
+        self.height = height
+        self.match_threshold = match_threshold
+        self.min_char_width = min_char_width
+        self.min_char_height = min_char_height
+        # "otsu" (global), "tiled" (Otsu per tile) or "sauvola"
+        self.binarizer = binarizer
+        # "contours" (findContours) or "components" (connectedComponentsWithStats)
+        self.segmenter = segmenter
+        self.merge_parts = merge_parts
+        # touching glyphs: wide blobs split where the pieces match better
+        self.split_touching = split_touching
+        self.split_stats = {"wide": 0, "split": 0, "pieces": 0}
+        # coarse-to-fine: only the prune_k nearest templates get the full score
+        self.prune_k = prune_k
+        self.prune_check = prune_check
+        self.prune_stats = {"glyphs": 0, "mismatches": 0}
+        # components found / dropped as too small (noise) by segment()
+        self.noise_stats = {"pages": 0, "components": 0, "noise_components": 0}
+        # >1: keep the top_k candidates of every glyph (same score matrix)
+        self.top_k = max(1, int(top_k))
+        # the stats dicts are updated from the worker threads of the service/pipeline
+        self._stats_lock = threading.Lock()
+
+        self.scales = tuple(sorted(set(scales))) if scales else ()
+        if self.scales:
+            # the scale closest to the configured size serves bank/width/height;
+            # lines are never matched below it, so smaller scales would be dead weight
+            base = min(self.scales, key=lambda sc: abs(sc - height))
+            if self.scales[0] < base:
+                raise ValueError(f"scales {[sc for sc in self.scales if sc < base]} are "
+                                 f"below the {base}px base size and would never be used")
+            pyramid = load_pyramid(template_dirs, self.scales, template_cache, verbose)
+            self.bank, self.width, self.height = pyramid[base], base, base
+            self.banks = {(sc, sc): bank for sc, bank in pyramid.items()}
+        else:
+            if template_cache:
+                # compiled .npz bank: memory-mapped, rebuilt only when a template changes
+                from template_cache import load_or_compile
+                self.bank = load_or_compile(template_dirs, template_cache, width, height,
+                                            verbose=verbose)
+            else:
+                templates = load_templates(template_dirs, width, height, verbose=verbose)
+                self.bank = TemplateBank.from_dict(templates)
+            self.banks = {(height, width): self.bank}
+
+        self.metrics = Metrics() if metrics is True else (metrics or None)
+        self.debug_writer = None
+        if debug_dir:
+            self.debug_writer = DebugWriter(debug_dir, self.bank, debug_sample, debug_rate)
+
+        # LRU cache of (char, score) per glyph bitmap, skips matching for repeats
+        self.glyph_cache = None
+        if glyph_cache_size:
+            bank_id = "+".join(b.fingerprint for _, b in sorted(self.banks.items()))
+            # every setting that changes the stored answers is part of the key
+            if self.top_k > 1:
+                bank_id += f"/top{self.top_k}"
+            if self.prune_k:
+                # pruned answers may differ from the exhaustive ones
+                bank_id += f"/prune{self.prune_k}"
+            self.glyph_cache = GlyphCache(glyph_cache_size, glyph_cache_perceptual,
+                                          glyph_cache_file, bank_id)
+
+    def binarize(self, image, stats=None):
+        """BGR/gray page -> binary image with text = 255, background = 0
+        (method ``binarizer``, global Otsu by default).
+
+        ``stats`` is the binarization.PageStats of the gray page; pass the
+        same one for every pass over a page (another method, a retry) so its
+        tile histograms and box filters are computed once. Without it one is
+        made here (nothing is computed until the method needs it)."""
+        with timed(self.metrics, "threshold"):
+            if stats is None:
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+                stats = PageStats(gray)
+            return binarize(stats.gray, self.binarizer, stats)
+
+    def _add_stats(self, totals, page_stats):
+        with self._stats_lock:
+            for key, value in page_stats.items():
+                totals[key] += value
+
+    def segment(self, thresh, match=None, matched=None):
+        """Bounding boxes of candidate glyphs in reading order, (N, 4) array of
+        (x, y, w, h). With ``merge_parts`` merges that match worse are
+        undone (check_merged_parts()), with ``split_touching`` blobs of
+        touching glyphs are replaced by their pieces (split_wide()). The
+        glyphs these checks match go through ``match`` (default:
+        self.match), e.g. the service's micro-batcher. Boxes whose final
+        match is already known from split_wide() are added to the list
+        ``matched`` as merge_groups() parts; pass it on to
+        normalize_groups() and merge_groups() to skip matching them again."""
+        page_stats = {}
+        boxes = segmentation.segment(thresh, self.segmenter, merge_parts=self.merge_parts,
+                                     min_width=self.min_char_width,
+                                     min_height=self.min_char_height, metrics=self.metrics,
+                                     stats=page_stats)
+        self._add_stats(self.noise_stats, page_stats)
+        match = match or self.match
+        if self.merge_parts and self.segmenter == "components":
+            boxes = self.check_merged_parts(thresh, boxes, match)
+        if self.split_touching:
+            boxes = self.split_wide(thresh, boxes, match, matched)
+        return boxes
+
+    def check_merged_parts(self, thresh, boxes, match=None):
+        """Undo merges of a dot/accent into a glyph (merge_parts) where the
+        glyph alone matches better, e.g. templates drawn without the dot of
+        i/j. A merged box is the only kind with an empty row inside; its
+        main part is what lies below the last empty row. Both versions of
+        all merged boxes are matched in one batch."""
+        boxes = layout.as_boxes(boxes).copy()
+        merged, main = [], []
+        for i, (x, y, w, h) in enumerate(boxes.tolist()):
+            rows = thresh[y:y + h, x:x + w].any(axis=1)
+            if rows.all():
+                continue
+            top = h - int(np.argmin(rows[::-1]))
+            cols = np.flatnonzero(thresh[y + top:y + h, x:x + w].any(axis=0))
+            merged.append(i)
+            main.append((x + cols[0], y + top, cols[-1] - cols[0] + 1, h - top))
+        if not merged:
+            return boxes
+        _, scores, *_ = (match or self.match)(self.normalize(thresh, np.concatenate(
+            [boxes[merged], layout.as_boxes(main)])))
+        better = scores[len(merged):] > scores[:len(merged)]
+        boxes[np.asarray(merged)[better]] = layout.as_boxes(main)[better]
+        return boxes
+
+    def split_wide(self, thresh, boxes, match=None, matched=None):
+        """Split the boxes that are too wide for their line where the pieces
+        match above the threshold and the whole blob does not; the pieces
+        of all wide boxes are matched in one batch (splitting.split_touching).
+        Their results go to ``matched`` unless a template pyramid matches
+        the page at other sizes."""
+        page_stats = {}
+        boxes = splitting.split_touching(thresh, boxes, self.normalize, match or self.match,
+                                         self.match_threshold, stats=page_stats,
+                                         matched=None if self.scales else matched)
+        self._add_stats(self.split_stats, page_stats)
+        if self.metrics is not None:
+            self.metrics.count("split_blobs", page_stats.get("split", 0))
+        return boxes
+
+    def normalize(self, thresh, boxes):
+        """Crop each box from thresh and normalize it to the template size,
+        all into one contiguous (N, H, W) uint8 tensor."""
+        with timed(self.metrics, "normalize"):
+            return normalize_boxes(thresh, boxes, self.width, self.height)
+
+    def normalize_groups(self, thresh, boxes, matched=()):
+        """Normalized glyphs grouped by template scale: [(indices, rois)].
+
+        Without ``scales`` this is one group with normalize(). With a
+        pyramid every line is normalized at the smallest scale that is at
+        least its glyph height (layout.line_heights), and at least the base
+        template size. Boxes of the ``matched`` parts (see segment()) are
+        left out."""
+        boxes = layout.as_boxes(boxes)
+        todo = np.arange(len(boxes))
+        if matched:
+            todo = np.setdiff1d(todo, np.concatenate([part[0] for part in matched]))
+        if not self.scales:
+            return [(todo, self.normalize(thresh, boxes[todo]))]
+
+        with timed(self.metrics, "normalize"):
+            # smallest scale that does not shrink the line's glyphs (all
+            # scales are >= the base size, see __init__)
+            usable = np.array(self.scales)
+            heights = layout.line_heights(boxes)[todo]
+            pick = np.minimum(np.searchsorted(usable, heights), len(usable) - 1)
+            groups = []
+            for k in np.unique(pick):
+                idx = todo[pick == k]
+                size = int(usable[k])
+                groups.append((idx, normalize_boxes(thresh, boxes[idx], size, size)))
+            return groups
+
+    @staticmethod
+    def merge_groups(n, parts):
+        """Put [(indices, chars, scores)] of normalize_groups() back into
+        page order: (chars, scores) for ``n`` glyphs. Parts with top-K
+        candidates, (indices, chars, scores, top_chars, top_scores), give
+        (chars, scores, top_chars, top_scores)."""
+        chars = [None] * n
+        scores = np.zeros(n, dtype=np.float32)
+        top = any(len(part) > 3 for part in parts)
+        if top:
+            k = max(part[4].shape[1] for part in parts)
+            top_chars = [[] for _ in range(n)]
+            top_scores = np.full((n, k), -1.0, dtype=np.float32)
+        for idx, part_chars, part_scores, *part_top in parts:
+            for i, char in zip(idx, part_chars):
+                chars[i] = char
+            scores[idx] = part_scores
+            if part_top:
+                for i, row in zip(idx, part_top[0]):
+                    top_chars[i] = row
+                top_scores[idx, :part_top[1].shape[1]] = part_top[1]
+        if top:
+            return chars, scores, top_chars, top_scores
+        return chars, scores
+
+    def match(self, rois):
+        """Best (chars, scores) for a (N, H, W) batch of normalized ROIs
+        (matched against the bank of size (H, W)). With ``top_k > 1``:
+        (chars, scores, top_chars, top_scores), see TemplateBank.match()."""
+        with timed(self.metrics, "match"):
+            return self._match_cached(rois)
+
+    def _match_cached(self, rois):
+        if self.glyph_cache is None or len(rois) == 0:
+            return self._match_templates(rois)
+
+        keys, chars, scores, tops, missing = self.glyph_cache.lookup(rois)
+        if len(missing):
+            # identical glyphs of this batch are matched once
+            first = {}
+            slot = [first.setdefault(keys[0][i], len(first)) for i in missing]
+            unique = missing[np.unique(slot, return_index=True)[1]]
+            new_chars, new_scores, *new_top = self._match_templates(rois[unique])
+            new_tops = list(zip(*new_top)) if new_top else None
+            self.glyph_cache.store(keys, unique, new_chars, new_scores, new_tops)
+            for i, j in zip(missing, slot):
+                chars[i] = new_chars[j]
+                if new_tops:
+                    tops[i] = new_tops[j]
+            scores[missing] = new_scores[slot]
+        if self.top_k > 1:
+            return chars, scores, [list(t[0]) for t in tops], np.array([t[1] for t in tops],
+                                                                       dtype=np.float32)
+        return chars, scores
+
+    def _match_templates(self, rois):
+        bank = self.banks.get(rois.shape[1:], self.bank) if len(rois) else self.bank
+        if not self.prune_k:
+            return bank.match(rois, self.top_k)
+        if not self.prune_check:
+            return bank.match_pruned(rois, self.prune_k, top_k=self.top_k)
+
+        page_stats = {}
+        out = bank.match_pruned(rois, self.prune_k, stats=page_stats, top_k=self.top_k)
+        self._add_stats(self.prune_stats, page_stats)
+        if self.metrics is not None:
+            self.metrics.count("prune_checked_glyphs", page_stats.get("glyphs", 0))
+            self.metrics.count("prune_mismatches", page_stats.get("mismatches", 0))
+        return out
+
+    def close(self):
+        """Flush the debug writer and save the glyph cache file (if any)."""
+        if self.debug_writer is not None:
+            self.debug_writer.close()
+        if self.glyph_cache is not None and self.glyph_cache.path:
+            self.glyph_cache.save()
+
+    def save_rejected(self, thresh, boxes, rois, chars, scores, page="page"):
+        """Hand the glyphs below the threshold to the debug writer (no-op
+        without ``debug_dir``)."""
+        if self.debug_writer is None:
+            return
+        rejected = np.flatnonzero(np.asarray(scores) <= self.match_threshold)
+        if len(rejected):
+            boxes = layout.as_boxes(boxes)
+            if rois is None:
+                # pyramid: keep the rejected glyphs at the base template size
+                rois = np.zeros((len(boxes), self.height, self.width), dtype=np.uint8)
+                rois[rejected] = normalize_boxes(thresh, boxes[rejected], self.width, self.height)
+            self.debug_writer.submit(thresh, boxes, rois, chars, scores, rejected, page)
+
+    def recognize(self, image, page="page"):
+        """Run the full pipeline on a BGR or grayscale ndarray.
+
+        Returns a dict (JSON-serializable):
+            rows     - recognized text, one string per line (top to bottom)
+            lines    - same as rows but with a space at every word boundary
+            text     - ''.join(rows)
+            chars    - accepted chars in segmentation order
+            boxes    - [x, y, w, h] for each accepted char
+            scores   - match score for each accepted char
+            rejected - [{"box", "char", "score"}] for glyphs below the threshold
+            candidates, candidate_scores - only with top_k > 1: the top_k
+                       chars and scores of each accepted char, best first
+                       (rejected glyphs carry the same two fields)
+
+        ``page`` names the debug archive of the page's rejected glyphs.
+        """
+        return self.recognize_binary(self.binarize(image), page)
+
+    def recognize_binary(self, thresh, page="page"):
+        """Same as recognize() for an already binarized page (text = 255)."""
+        t0 = time.perf_counter()
+        matched = []
+        boxes = self.segment(thresh, matched=matched)
+        groups = self.normalize_groups(thresh, boxes, matched)
+        best_chars, best_scores, *top = self.merge_groups(
+            len(boxes), matched + [(idx, *self.match(rois)) for idx, rois in groups])
+        rois = None if self.scales or matched else groups[0][1]
+
+        result = self.assemble(boxes, best_chars, best_scores, *top)
+        self.save_rejected(thresh, boxes, rois, best_chars, best_scores, page)
+        if self.metrics is not None:
+            self.metrics.observe_page(len(boxes), best_scores, time.perf_counter() - t0)
+        return result
+
+    def assemble(self, boxes, best_chars, best_scores, top_chars=None, top_scores=None):
+        """Build the recognize() result from the boxes and their best matches:
+        apply the threshold and group the accepted chars into lines. With
+        ``top_chars``/``top_scores`` (see match()) the candidates are added."""
+        result = {"rows": [], "lines": [], "text": "", "chars": [], "boxes": [],
+                  "scores": [], "rejected": []}
+        top = top_chars is not None
+        if top:
+            result["candidates"], result["candidate_scores"] = [], []
+            top_scores = np.round(np.asarray(top_scores, dtype=np.float64), 6).tolist()
+        for i, ((x, y, w, h), char, score) in enumerate(zip(layout.as_boxes(boxes).tolist(),
+                                                            best_chars, best_scores)):
+            score = float(score)
+            if score > self.match_threshold:
+                result["chars"].append(char)
+                result["boxes"].append([x, y, w, h])
+                result["scores"].append(score)
+                if top:
+                    result["candidates"].append(top_chars[i])
+                    result["candidate_scores"].append(top_scores[i])
+            else:
+                rejected = {"box": [x, y, w, h], "char": char, "score": score}
+                if top:
+                    rejected["candidates"] = top_chars[i]
+                    rejected["candidate_scores"] = top_scores[i]
+                result["rejected"].append(rejected)
+
+        with timed(self.metrics, "group"):
+            result["rows"], result["lines"] = layout.group_lines(result["boxes"], result["chars"])
+        result["text"] = ''.join(result["rows"])
+        return result
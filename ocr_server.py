@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from binarization import BINARIZERS
+from debug_writer import DEBUG_RATE, DEBUG_SAMPLE
+from metrics import Metrics, timed
+from ocr_engine import OCREngine, parse_scales
+
+# --- การตั้งค่าเริ่มต้นของ service ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+WORKERS = 4            # จำนวนคำขอที่ประมวลผลพร้อมกัน (decode/threshold/segment)
+QUEUE_SIZE = 32        # คำขอที่รอคิวได้ เกินนี้ตอบ 503
+BATCH_WAIT_MS = 5      # เวลารอรวม glyph จากหลายคำขอก่อน match
+MAX_BATCH_GLYPHS = 4096
+MAX_BODY_BYTES = 64 * 1024 * 1024
+REQUEST_TIMEOUT = 60.0
+
+
+class MicroBatcher:
+    """Collects normalized glyphs from concurrent requests and scores them
+    with one engine.match() call.
+
+    submit() returns a Future for (chars, scores), or for (chars, scores,
+    top_chars, top_scores) when the engine has ``top_k > 1``. The background thread
+    takes the first waiting batch, keeps collecting for up to ``max_wait``
+    seconds (or ``max_glyphs`` glyphs), matches everything at once and
+    hands every request its own slice of the result.
+    """
+
+    def __init__(self, engine, max_wait=BATCH_WAIT_MS / 1000.0, max_glyphs=MAX_BATCH_GLYPHS):
+        self.engine = engine
+        self.max_wait = max_wait
+        self.max_glyphs = max_glyphs
+        self.stats = {"batches": 0, "requests": 0, "glyphs": 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="ocr-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, rois):
+        future = Future()
+        if len(rois) == 0:
+            empty = ([], np.zeros(0, dtype=np.float32))
+            if self.engine.top_k > 1:
+                empty += ([], np.zeros((0, self.engine.top_k), dtype=np.float32))
+            future.set_result(empty)
+        else:
+            self._queue.put((rois, future))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        items = [first]
+        count = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_glyphs:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # let the next _collect() stop the thread
+                break
+            items.append(item)
+            count += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            if items is None:
+                return
+            # with a template pyramid the glyphs come in several sizes
+            by_size = {}
+            for item in items:
+                by_size.setdefault(item[0].shape[1:], []).append(item)
+            for group in by_size.values():
+                self._match_group(group)
+
+    def _match_group(self, items):
+        try:
+            out = self.engine.match(np.concatenate([rois for rois, _ in items]))
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(items)
+        self.stats["glyphs"] += len(out[0])
+        start = 0
+        for rois, future in items:
+            end = start + len(rois)
+            future.set_result(tuple(part[start:end] for part in out))
+            start = end
+
+
+class OCRService:
+    """Warm engine + bounded worker pool + micro-batcher, independent of the
+    transport (HTTP over TCP or a Unix domain socket)."""
+
+    def __init__(self, engine, workers=WORKERS, queue_size=QUEUE_SIZE,
+                 batch_wait_ms=BATCH_WAIT_MS, max_batch_glyphs=MAX_BATCH_GLYPHS):
+        self.engine = engine
+        self.batcher = MicroBatcher(engine, batch_wait_ms / 1000.0, max_batch_glyphs)
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="ocr-worker")
+        # running + waiting requests; a full queue is rejected instead of piling up
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self.rejected = 0
+
+    def _match_batched(self, rois):
+        return self.batcher.submit(rois).result(REQUEST_TIMEOUT)
+
+    def _process(self, data):
+        metrics = self.engine.metrics
+        t0 = time.perf_counter()
+        with timed(metrics, "imread"):
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError("request body is not a decodable image")
+        thresh = self.engine.binarize(image)
+        # glyphs matched while segmenting (merge/split checks) share the batches too
+        matched = []
+        boxes = self.engine.segment(thresh, self._match_batched, matched)
+        groups = self.engine.normalize_groups(thresh, boxes, matched)
+        futures = [(idx, self.batcher.submit(rois)) for idx, rois in groups]
+        chars, scores, *top = self.engine.merge_groups(
+            len(boxes), matched + [(idx, *f.result(REQUEST_TIMEOUT)) for idx, f in futures])
+        result = self.engine.assemble(boxes, chars, scores, *top)
+        rois = None if self.engine.scales or matched else groups[0][1]
+        self.engine.save_rejected(thresh, boxes, rois, chars, scores, "request")
+        if metrics is not None:
+            metrics.observe_page(len(boxes), scores, time.perf_counter() - t0)
+        return result
+
+    def recognize_bytes(self, data):
+        """OCR encoded image bytes. Returns the result dict, or None if the
+        request queue is full."""
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            if self.engine.metrics is not None:
+                self.engine.metrics.count("rejected_requests")
+            return None
+        try:
+            future = self.pool.submit(self._process, data)
+        except BaseException:
+            self._slots.release()
+            raise
+        # the slot is held until the work itself ends, not when the caller
+        # gives up waiting, so timed-out requests still count against the queue
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(REQUEST_TIMEOUT)
+
+    def health(self):
+        return {"status": "ok", "templates": len(self.engine.bank),
+                "rejected": self.rejected, "batcher": dict(self.batcher.stats)}
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.batcher.close()
+        self.engine.close()
+
+
+class OCRRequestHandler(BaseHTTPRequestHandler):
+    """POST /ocr with the raw image bytes as body -> JSON result.
+    GET /health -> service status, GET /metrics -> Prometheus text format."""
+
+    server_version = "TemplateOCR/1.0"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.server.service.health())
+        elif self.path == "/metrics" and self.server.service.engine.metrics is not None:
+            body = self.server.service.engine.metrics.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/ocr":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY_BYTES:
+            self._send_json(400, {"error": "missing or too large request body"})
+            return
+
+        data = self.rfile.read(length)
+        try:
+            result = self.server.service.recognize_bytes(data)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        if result is None:
+            self._send_json(503, {"error": "request queue is full"})
+        else:
+            self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # Unix socket clients have no (host, port); BaseHTTPRequestHandler wants one
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None,
+                verbose=False):
+    """HTTP server bound to host:port (port 0 picks a free port) or, when
+    ``unix_socket`` is given, to that Unix domain socket path."""
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = _UnixHTTPServer(unix_socket, OCRRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), OCRRequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, workers=WORKERS,
+          queue_size=QUEUE_SIZE, batch_wait_ms=BATCH_WAIT_MS, verbose=False, **engine_kwargs):
+    """Start the OCR service and block until interrupted."""
+    engine = OCREngine(verbose=True, metrics=Metrics(), **engine_kwargs)
+    service = OCRService(engine, workers, queue_size, batch_wait_ms)
+    server = make_server(service, host, port, unix_socket, verbose)
+    where = unix_socket or "http://%s:%d" % server.server_address[:2]
+    print(f"OCR service พร้อมใช้งานที่ {where} (POST /ocr, GET /health, GET /metrics)",
+          flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent template-matching OCR service")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='TCP port (0 = pick a free port)')
+    parser.add_argument('--unix', metavar='PATH', help='Listen on a Unix domain socket instead')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='Requests processed concurrently')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+                        help='Requests allowed to wait; more are answered with 503')
+    parser.add_argument('--batch-wait-ms', type=float, default=BATCH_WAIT_MS,
+                        help='How long to gather glyphs of concurrent requests per match call')
+    parser.add_argument('--template-cache', metavar='NPZ')
+    parser.add_argument('--scales', type=parse_scales, metavar='S1,S2,...',
+                        help='Template pyramid sizes, e.g. 30,48,64')
+    parser.add_argument('--binarize', choices=BINARIZERS, default="otsu",
+                        help='Page threshold method (default: global otsu)')
+    parser.add_argument('--split-touching', action='store_true',
+                        help='Split over-wide blobs of touching glyphs before matching')
+    parser.add_argument('--debug-dir', metavar='DIR',
+                        help='Save glyphs below the match threshold (sampled, rate-limited)')
+    parser.add_argument('--debug-sample', type=float, default=DEBUG_SAMPLE)
+    parser.add_argument('--debug-rate', type=float, default=DEBUG_RATE)
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    return serve(args.host, args.port, args.unix, args.workers, args.queue_size,
+                 args.batch_wait_ms, args.verbose, template_cache=args.template_cache,
+                 debug_dir=args.debug_dir, debug_sample=args.debug_sample,
+                 debug_rate=args.debug_rate, scales=args.scales, binarizer=args.binarize,
+                 split_touching=args.split_touching)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
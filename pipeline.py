@@ -0,0 +1,233 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from metrics import timed
+from ocr_engine import OCREngine
+
+# --- การตั้งค่าเริ่มต้นของ pipeline ---
+READERS = 4         # thread อ่าน/decode ไฟล์ภาพ (I/O)
+QUEUE_SIZE = 8      # จำนวนหน้าที่รอได้ระหว่างแต่ละขั้น
+
+_DONE = object()
+
+
+def default_workers():
+    """(preprocess, match) thread counts for this machine: OpenCV and the
+    NumPy matrix multiply release the GIL, so both scale with the cores."""
+    cores = os.cpu_count() or 1
+    return max(1, cores // 2), max(1, cores - cores // 2)
+
+
+class _Stage:
+    """``workers`` threads applying ``fn`` to the items of ``inq`` and
+    putting the results on ``outq``; tracks busy time for the report."""
+
+    def __init__(self, name, fn, workers, inq, outq, stop):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inq = inq
+        self.outq = outq
+        self.stop = stop
+        self.busy = 0.0
+        self.items = 0
+        self._running = workers
+        self._lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._run, name=f"ocr-{name}-{i}", daemon=True)
+                        for i in range(workers)]
+
+    def start(self):
+        for t in self.threads:
+            t.start()
+
+    def _run(self):
+        busy = 0.0
+        items = 0
+        while not self.stop.is_set():
+            item = _get(self.inq, self.stop)
+            if item is _DONE or item is None:
+                break
+            t0 = time.perf_counter()
+            out = self.fn(item)
+            busy += time.perf_counter() - t0
+            items += 1
+            if not _put(self.outq, out, self.stop):
+                break
+
+        with self._lock:
+            self.busy += busy
+            self.items += items
+            self._running -= 1
+            last = self._running == 0
+        if last:
+            # the next stage stops once every worker of this one is done
+            _put(self.outq, _DONE, self.stop)
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            q.put(_DONE)  # leave it for the other workers of the stage
+        return item
+    return None
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class PagePipeline:
+    """Thread pipeline over one shared OCREngine:
+
+        paths -> read (cv2.imread) -> preprocess (threshold, segment,
+                 normalize) -> match (score, assemble) -> records
+
+    Stages are connected by bounded queues, so decoding, OpenCV work and
+    the matrix multiplies of different pages overlap while at most a few
+    pages per stage are held in memory. After a run ``report()`` gives the
+    utilization of every stage (busy time / (wall time * threads)): a stage
+    near 100% is the bottleneck and needs more threads.
+    """
+
+    def __init__(self, engine, readers=READERS, preprocess_workers=None, match_workers=None,
+                 queue_size=QUEUE_SIZE):
+        default_pre, default_match = default_workers()
+        self.engine = engine
+        self.readers = readers
+        self.preprocess_workers = preprocess_workers or default_pre
+        self.match_workers = match_workers or default_match
+        self.queue_size = queue_size
+        self.stages = []
+        self.wall = 0.0
+
+    def _read(self, job):
+        index, path = job
+        record = {"index": index, "path": path}
+        try:
+            with timed(self.engine.metrics, "imread"):
+                image = cv2.imread(path)
+            if image is None:
+                record["error"] = f"cannot read image '{path}'"
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            image = None
+        return record, image
+
+    def _preprocess(self, item):
+        record, image = item
+        if "error" in record:
+            return record, None
+        try:
+            t0 = time.perf_counter()
+            thresh = self.engine.binarize(image)
+            matched = []
+            boxes = self.engine.segment(thresh, matched=matched)
+            groups = self.engine.normalize_groups(thresh, boxes, matched)
+            return record, (thresh, boxes, matched, groups, time.perf_counter() - t0)
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            return record, None
+
+    def _match(self, item):
+        record, work = item
+        if work is None:
+            return record
+        thresh, boxes, matched, groups, seconds = work
+        engine = self.engine
+        try:
+            t0 = time.perf_counter()
+            chars, scores, *top = engine.merge_groups(
+                len(boxes), matched + [(idx, *engine.match(rois)) for idx, rois in groups])
+            record.update(engine.assemble(boxes, chars, scores, *top))
+            rois = None if engine.scales or matched else groups[0][1]
+            engine.save_rejected(thresh, boxes, rois, chars, scores, record["path"])
+            if engine.metrics is not None:
+                engine.metrics.observe_page(len(boxes), scores,
+                                            seconds + time.perf_counter() - t0)
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        return record
+
+    def run(self, paths, ordered=False):
+        """Yield one record per path (same fields as batch_ocr.run_batch)."""
+        stop = threading.Event()
+        jobs = queue.Queue()
+        for job in enumerate(paths):
+            jobs.put(job)
+        jobs.put(_DONE)
+
+        read_q = queue.Queue(self.queue_size)
+        pre_q = queue.Queue(self.queue_size)
+        out_q = queue.Queue(self.queue_size)
+        self.stages = [
+            _Stage("read", self._read, self.readers, jobs, read_q, stop),
+            _Stage("preprocess", self._preprocess, self.preprocess_workers, read_q, pre_q, stop),
+            _Stage("match", self._match, self.match_workers, pre_q, out_q, stop),
+        ]
+        t0 = time.perf_counter()
+        for stage in self.stages:
+            stage.start()
+
+        pending = {}
+        next_index = 0
+        try:
+            while True:
+                record = out_q.get()
+                if record is _DONE:
+                    break
+                if not ordered:
+                    yield record
+                    continue
+                pending[record["index"]] = record
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+        finally:
+            stop.set()
+            for stage in self.stages:
+                for t in stage.threads:
+                    t.join()
+            self.wall = time.perf_counter() - t0
+
+    def report(self):
+        """Per-stage threads, pages, busy seconds and utilization of the last run."""
+        return {stage.name: {"threads": stage.workers, "pages": stage.items,
+                             "busy_s": stage.busy,
+                             "utilization": stage.busy / (self.wall * stage.workers)
+                             if self.wall else 0.0}
+                for stage in self.stages}
+
+    def format_report(self):
+        lines = [f"pipeline {self.wall:.2f} s"]
+        for name, st in self.report().items():
+            lines.append(f"  {name:<10} threads {st['threads']:>3}  pages {st['pages']:>6}  "
+                         f"busy {st['busy_s']:8.2f} s  utilization {st['utilization']:6.1%}")
+        return "\n".join(lines)
+
+
+def run_pipeline(paths, readers=READERS, preprocess_workers=None, match_workers=None,
+                 queue_size=QUEUE_SIZE, ordered=False, engine_kwargs=None, pipeline=None):
+    """Threaded alternative to batch_ocr.run_batch(): one engine in this
+    process, stages overlapped with threads. Pass ``pipeline`` (a
+    PagePipeline) to read its report() afterwards."""
+    if pipeline is None:
+        pipeline = PagePipeline(OCREngine(**(engine_kwargs or {})), readers,
+                                preprocess_workers, match_workers, queue_size)
+    try:
+        yield from pipeline.run(paths, ordered)
+    finally:
+        pipeline.engine.close()
@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+
+import layout
+
+# คอลัมน์ของตารางผล (หนึ่งแถวต่อ glyph)
+COLUMNS = ("page", "line", "x", "y", "w", "h", "char", "score", "accepted",
+           "cand_chars", "cand_scores")
+
+
+def empty_table(k=1):
+    """Table with no rows (``k`` candidate columns)."""
+    return {"page": np.zeros(0, dtype=np.int32), "line": np.zeros(0, dtype=np.int32),
+            "x": np.zeros(0, dtype=np.int32), "y": np.zeros(0, dtype=np.int32),
+            "w": np.zeros(0, dtype=np.int32), "h": np.zeros(0, dtype=np.int32),
+            "char": np.zeros(0, dtype='<U1'), "score": np.zeros(0, dtype=np.float32),
+            "accepted": np.zeros(0, dtype=bool),
+            "cand_chars": np.zeros((0, k), dtype='<U1'),
+            "cand_scores": np.zeros((0, k), dtype=np.float32)}
+
+
+def page_table(result, page=0):
+    """Columnar table of one recognize() result: a dict of NumPy arrays,
+    one row per glyph (accepted chars in segmentation order, then the
+    rejected ones).
+
+        page, line        int32  page number, line number (-1 if rejected)
+        x, y, w, h        int32  box
+        char, score              best char and its score
+        accepted          bool   score above the match threshold
+        cand_chars        (N, K) top-K chars (K = 1: the best char)
+        cand_scores       (N, K) their scores, -1 where a glyph has fewer
+    """
+    rejected = result.get("rejected", [])
+    boxes = layout.as_boxes(result["boxes"] + [r["box"] for r in rejected])
+    n_ok = len(result["chars"])
+    if len(boxes) == 0:
+        return empty_table()
+
+    chars = list(result["chars"]) + [r["char"] for r in rejected]
+    scores = list(result["scores"]) + [r["score"] for r in rejected]
+    if "candidates" in result:
+        cands = list(result["candidates"]) + [r["candidates"] for r in rejected]
+        cand_scores = list(result["candidate_scores"]) + [r["candidate_scores"] for r in rejected]
+    else:
+        cands = [[c] for c in chars]
+        cand_scores = [[s] for s in scores]
+
+    k = max(len(c) for c in cands)
+    cand_chars = np.full((len(boxes), k), '', dtype=object)
+    cand_score_arr = np.full((len(boxes), k), -1.0, dtype=np.float32)
+    for i, (c, s) in enumerate(zip(cands, cand_scores)):
+        cand_chars[i, :len(c)] = c
+        cand_score_arr[i, :len(s)] = s
+
+    line = np.full(len(boxes), -1, dtype=np.int32)
+    line[:n_ok] = layout.row_ids(boxes[:n_ok])
+    return {"page": np.full(len(boxes), page, dtype=np.int32), "line": line,
+            "x": boxes[:, 0].astype(np.int32), "y": boxes[:, 1].astype(np.int32),
+            "w": boxes[:, 2].astype(np.int32), "h": boxes[:, 3].astype(np.int32),
+            "char": np.array(chars, dtype=str), "score": np.array(scores, dtype=np.float32),
+            "accepted": np.arange(len(boxes)) < n_ok,
+            "cand_chars": cand_chars.astype(str), "cand_scores": cand_score_arr}
+
+
+def concat_tables(tables):
+    """Stack page tables into one (candidate columns padded to the widest)."""
+    tables = [t for t in tables if len(t["page"])]
+    if not tables:
+        return empty_table()
+    k = max(t["cand_chars"].shape[1] for t in tables)
+    out = {}
+    for col in COLUMNS:
+        parts = [t[col] for t in tables]
+        if col in ("cand_chars", "cand_scores"):
+            fill = '' if col == "cand_chars" else -1.0
+            parts = [np.pad(p, ((0, 0), (0, k - p.shape[1])), constant_values=fill)
+                     for p in parts]
+        out[col] = np.concatenate(parts)
+    return out
+
+
+class TableWriter:
+    """Collects page tables while records stream by (e.g. in front of
+    batch_ocr.write_jsonl) and saves them as one table at the end."""
+
+    def __init__(self):
+        self.pages = []
+        self.tables = []
+
+    def add(self, result, page_name):
+        self.tables.append(page_table(result, len(self.pages)))
+        self.pages.append(page_name)
+
+    def tee(self, records):
+        """Pass ``records`` through, adding the ones without error."""
+        for record in records:
+            if "error" not in record:
+                self.add(record, record.get("path", f"page{len(self.pages)}"))
+            yield record
+
+    def save(self, path):
+        save_table(path, concat_tables(self.tables), self.pages)
+
+
+def save_table(path, table, pages=()):
+    """Write a table as an uncompressed .npz (one array per column, plus
+    ``pages``: the page names indexed by the ``page`` column). Atomic."""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, pages=np.array(list(pages), dtype=str), **table)
+    os.replace(tmp_path, path)
+
+
+def load_table(path):
+    """(table, pages) from save_table()."""
+    with np.load(path) as data:
+        table = {col: data[col] for col in COLUMNS}
+        return table, data["pages"].tolist()
@@ -0,0 +1,161 @@
+import numpy as np
+
+import layout
+
+# กล่องที่กว้างกว่า SPLIT_WIDTH เท่าของความสูงบรรทัดอาจเป็นตัวอักษรติดกันหลายตัว
+SPLIT_WIDTH = 1.0
+# ชิ้นที่ตัดออกต้องกว้างอย่างน้อยสัดส่วนนี้ของความกว้างกลางของ glyph ในหน้า
+# (กันไม่ให้เศษแคบ ๆ กลายเป็น I/1/i ปลอม)
+MIN_PIECE = 0.3
+# at most this many cut points per blob: at most (MAX_CUTS + 1)(MAX_CUTS + 2) / 2 - 1
+# pieces are scored and 2 ** MAX_CUTS - 1 segmentations compared
+MAX_CUTS = 4
+
+
+def wide_boxes(boxes, factor=SPLIT_WIDTH):
+    """Indices of the boxes wider than ``factor`` x the glyph height of
+    their line (layout.line_heights), and those line heights."""
+    boxes = layout.as_boxes(boxes)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    heights = layout.line_heights(boxes)
+    wide = np.flatnonzero(boxes[:, 2] > factor * heights)
+    return wide, heights[wide]
+
+
+def split_points(column_ink, min_piece, max_cuts=MAX_CUTS):
+    """Candidate cut columns of one blob from its vertical projection
+    (ink pixels per column): local minima at least ``min_piece`` from the
+    blob edges and from each other, lowest first, at most ``max_cuts``.
+    Returns them sorted left to right."""
+    ink = np.asarray(column_ink, dtype=np.int64)
+    w = len(ink)
+    lo, hi = int(np.ceil(min_piece)), w - int(np.ceil(min_piece))
+    if hi <= lo:
+        return np.zeros(0, dtype=np.int64)
+    c = np.arange(max(lo, 1), min(hi + 1, w - 1))
+    minima = c[(ink[c] <= ink[c - 1]) & (ink[c] <= ink[c + 1])]
+
+    cuts = []
+    for col in minima[np.argsort(ink[minima], kind='stable')].tolist():
+        if all(abs(col - other) >= min_piece for other in cuts):
+            cuts.append(col)
+            if len(cuts) == max_cuts:
+                break
+    return np.array(sorted(cuts), dtype=np.int64)
+
+
+def piece_boxes(thresh, box, cuts):
+    """Boxes of every piece between two points of [0, *cuts, w] of ``box``
+    except the whole box: (pieces (P, 4), their (start, end) point indices
+    (P, 2)). The height of a piece is the ink it contains."""
+    x, y, w, h = box
+    points = np.concatenate([[0], cuts, [w]])
+    starts, ends = np.triu_indices(len(points), 1)
+    keep = (ends - starts) < len(points) - 1
+    starts, ends = starts[keep], ends[keep]
+    rows_ink = thresh[y:y + h, x:x + w] > 0
+    pieces = np.empty((len(starts), 4), dtype=np.int64)
+    for k, (a, b) in enumerate(zip(points[starts].tolist(), points[ends].tolist())):
+        rows = np.flatnonzero(rows_ink[:, a:b].any(axis=1))
+        top, bottom = (rows[0], rows[-1] + 1) if len(rows) else (0, h)
+        pieces[k] = (x + a, y + top, b - a, bottom - top)
+    return pieces, np.stack([starts, ends], axis=1)
+
+
+def best_split(scores, spans, n_points, threshold):
+    """Best segmentation of one blob from the scores of its pieces.
+
+    Every subset of the inner points is a segmentation; only those whose
+    pieces all score above ``threshold`` count, and their value is the
+    mean score of the pieces. Returns (piece indices, mean) of the best
+    split with at least one cut (ties to fewer pieces), or (None, -inf)."""
+    index = {(a, b): k for k, (a, b) in enumerate(spans.tolist())}
+    inner = n_points - 2
+    best, best_mean = None, -np.inf
+    for mask in range(1, 2 ** inner):
+        points = [0] + [i + 1 for i in range(inner) if mask >> i & 1] + [n_points - 1]
+        ks = [index[a, b] for a, b in zip(points[:-1], points[1:])]
+        if scores[ks].min() <= threshold:
+            continue
+        mean = float(np.mean(scores[ks]))
+        if mean > best_mean or (mean == best_mean and len(ks) < len(best)):
+            best, best_mean = ks, mean
+    return best, best_mean
+
+
+def take_rows(out, rows):
+    """Rows ``rows`` of a match() result (lists and arrays alike)."""
+    return tuple([part[i] for i in rows] if isinstance(part, list) else np.asarray(part)[rows]
+                 for part in out)
+
+
+def split_touching(thresh, boxes, normalize, match, threshold, factor=SPLIT_WIDTH,
+                   min_piece=MIN_PIECE, max_cuts=MAX_CUTS, stats=None, matched=None):
+    """Split blobs of touching glyphs. Returns the new (N', 4) boxes in
+    reading order.
+
+    Boxes wider than ``factor`` x their line height are matched first
+    (``normalize(thresh, boxes)`` and ``match(rois)``, e.g.
+    OCREngine.normalize/match), all in one batch; the ones that already
+    match above ``threshold`` (wide letters such as m or W) are kept. The
+    others are cut at minima of their vertical projection (split_points),
+    with pieces at least ``min_piece`` x the median box width of the page
+    wide. Every piece between two cut points of all of them is matched in
+    a second batch and a blob is replaced by its best split (best_split),
+    if every piece of it matches above ``threshold``. With ``max_cuts``
+    cuts a blob costs at most (max_cuts + 1)(max_cuts + 2) / 2 glyph
+    matches.
+
+    ``stats`` (a dict) gets "wide", "split" and "pieces" (boxes added by
+    the splits) counts. ``matched`` (a list) gets the match results of
+    the returned boxes that were matched here, as (indices, *match(rois))
+    parts for OCREngine.merge_groups(), so they need not be matched again.
+    """
+    boxes = layout.as_boxes(boxes)
+    wide, _ = wide_boxes(boxes, factor)
+    if len(wide) == 0:
+        return boxes
+    whole = match(normalize(thresh, boxes[wide]))
+    failed = np.asarray(whole[1]) <= threshold
+    min_width = min_piece * np.median(boxes[:, 2])
+
+    blobs = []
+    for i in wide[failed].tolist():
+        x, y, w, h = boxes[i].tolist()
+        column_ink = np.count_nonzero(thresh[y:y + h, x:x + w], axis=0)
+        cuts = split_points(column_ink, min_width, max_cuts)
+        if len(cuts):
+            blobs.append((i, len(cuts) + 2, *piece_boxes(thresh, boxes[i], cuts)))
+    replace = {}
+    if blobs:
+        # one batch for the pieces of every wide blob of the page
+        pieces_out = match(normalize(thresh, np.concatenate([b[2] for b in blobs])))
+        piece_scores = np.asarray(pieces_out[1])
+    offset, chosen = 0, {}
+    for i, n_points, pieces, spans in blobs:
+        ks, _ = best_split(piece_scores[offset:offset + len(pieces)], spans, n_points, threshold)
+        if ks is not None:
+            replace[i] = pieces[ks]
+            chosen[i] = [offset + k for k in ks]
+        offset += len(pieces)
+
+    if stats is not None:
+        stats["wide"] = stats.get("wide", 0) + len(wide)
+        stats["split"] = stats.get("split", 0) + len(replace)
+        stats["pieces"] = stats.get("pieces", 0) + sum(len(p) - 1 for p in replace.values())
+    # position of every old box (or of its first piece) in the new boxes
+    sizes = np.ones(len(boxes), dtype=np.int64)
+    for i, pieces in replace.items():
+        sizes[i] = len(pieces)
+    start = np.cumsum(sizes) - sizes
+    if matched is not None:
+        kept = [k for k, i in enumerate(wide.tolist()) if i not in replace]
+        if kept:
+            matched.append((start[wide[kept]], *take_rows(whole, kept)))
+        if chosen:
+            idx = np.concatenate([start[i] + np.arange(len(ks)) for i, ks in chosen.items()])
+            matched.append((idx, *take_rows(pieces_out, sum(chosen.values(), []))))
+    if not replace:
+        return boxes
+    return np.concatenate([replace.get(i, boxes[i:i + 1]) for i in range(len(boxes))])
@@ -0,0 +1,148 @@
+import os
+
+import cv2
+import numpy as np
+
+import layout
+from binarization import binarize, otsu_from_histogram
+from splitting import take_rows
+
+BAND_HEIGHT = 2048  # จำนวนแถวพิกเซลต่อแถบ
+BAND_OVERLAP = 256  # ต้องสูงกว่าตัวอักษรที่สูงที่สุด ไม่เช่นนั้นตัวอักษรที่คร่อมแถบจะถูกตัด
+# จำนวน glyph แรกของหน้า (เรียงตามขอบบน) ที่ใช้ประมาณ row tolerance และช่องว่างระหว่างคำ
+SAMPLE_GLYPHS = 1000
+
+
+def open_page(path):
+    """Open a page for band-wise reading.
+
+    ``.npy`` files are memory-mapped, so a band is read from disk only when
+    it is sliced and the page is never held in RAM as a whole. Other
+    formats cannot be decoded partially by OpenCV; they are decoded once as
+    a single grayscale array (1 byte per pixel, no BGR/gray/threshold
+    copies of the full page).
+    """
+    if os.path.splitext(path)[1].lower() == '.npy':
+        return np.load(path, mmap_mode='r')
+    page = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if page is None:
+        raise IOError(f"cannot read image '{path}'")
+    return page
+
+
+def iter_bands(height, band_height=BAND_HEIGHT, overlap=BAND_OVERLAP):
+    """Yield (own_start, own_end, read_start, read_end) row ranges.
+
+    Every band owns rows [own_start, own_end) and is read with ``overlap``
+    extra rows above and below, so glyphs that cross a band boundary are
+    seen whole by the band that owns their top row.
+    """
+    for own_start in range(0, height, band_height):
+        own_end = min(height, own_start + band_height)
+        yield own_start, own_end, max(0, own_start - overlap), min(height, own_end + overlap)
+
+
+def _gray_band(page, start, end):
+    band = np.asarray(page[start:end])
+    if band.ndim == 3:
+        band = cv2.cvtColor(band, cv2.COLOR_BGR2GRAY)
+    return band
+
+
+def otsu_threshold(page, band_height=BAND_HEIGHT):
+    """Global Otsu threshold computed from a histogram accumulated band by
+    band; same value as cv2.threshold(..., THRESH_OTSU) on the whole page."""
+    hist = np.zeros(256, dtype=np.float64)
+    for start in range(0, len(page), band_height):
+        band = _gray_band(page, start, start + band_height)
+        hist += cv2.calcHist([band], [0], None, [256], [0, 256]).ravel()
+    return int(otsu_from_histogram(hist)[0])
+
+
+def line_spacing(boxes):
+    """(row tolerance, word gap threshold) estimated from ``boxes``, the same
+    statistics that layout.group_lines() takes from a whole page."""
+    tol = layout.row_tolerance(boxes)
+    order, rows = layout.reading_order(boxes, tol)
+    return tol, layout.estimate_word_gap(boxes, order, rows)
+
+
+def recognize_stream(engine, page, band_height=BAND_HEIGHT, overlap=BAND_OVERLAP,
+                     sample_glyphs=SAMPLE_GLYPHS):
+    """OCR a (possibly huge, memory-mapped) page band by band.
+
+    Yields one dict per text line, top to bottom:
+        {"line", "row", "chars", "boxes", "scores"} with boxes in page
+    coordinates (plus "candidates" and "candidate_scores" when the engine
+    has ``top_k > 1``). Only bands of pixels are held in memory.
+
+    The row tolerance and the word gap are estimated once from the first
+    ``sample_glyphs`` accepted glyphs of the page (by top row), so they do
+    not depend on the band size. A line is yielded as soon as the bands
+    read so far are past its lowest glyph center plus the row tolerance:
+    no glyph still to come can join it. Only the glyphs of unfinished
+    lines (and of the sample, until it is complete) are kept. The lines
+    are the same as recognize() on the page whenever the page has at most
+    ``sample_glyphs`` glyphs, and the same for every band size otherwise.
+    """
+    height = len(page)
+    thresh_value = otsu_threshold(page, band_height)
+    pending = []  # (box, char, score, candidates) of lines not yielded yet
+    spacing = None
+
+    for own_start, own_end, read_start, read_end in iter_bands(height, band_height, overlap):
+        band = _gray_band(page, read_start, read_end)
+        # local methods work on the band (the overlap covers their windows);
+        # the page-wide Otsu value replaces the band's own global threshold
+        thresh = binarize(band, engine.binarizer, global_threshold=thresh_value)
+        del band
+
+        matched = []
+        boxes = engine.segment(thresh, matched=matched)
+        top = boxes[:, 1] + read_start
+        # each glyph belongs to the band that owns its top row
+        own = (top >= own_start) & (top < own_end)
+        boxes = boxes[own]
+        # matches already known from segment(), renumbered to the owned boxes
+        new_index = np.cumsum(own) - 1
+        matched = [(new_index[idx[own[idx]]], *take_rows(part, np.flatnonzero(own[idx])))
+                   for idx, *part in matched if own[idx].any()]
+        groups = engine.normalize_groups(thresh, boxes, matched)
+        chars, scores, *top = engine.merge_groups(
+            len(boxes), matched + [(idx, *engine.match(rois)) for idx, rois in groups])
+        del thresh
+
+        for i, ((x, y, w, h), char, score) in enumerate(zip(boxes.tolist(), chars, scores)):
+            if score > engine.match_threshold:
+                cand = (top[0][i], top[1][i].tolist()) if top else None
+                pending.append(([x, y + read_start, w, h], char, float(score), cand))
+
+        last = own_end >= height
+        if not pending or (spacing is None and len(pending) < sample_glyphs and not last):
+            continue
+        boxes = layout.as_boxes([p[0] for p in pending])
+        if spacing is None:
+            # glyphs still to come start below own_end, so these are the first ones
+            first = np.lexsort((boxes[:, 3], boxes[:, 2], boxes[:, 0], boxes[:, 1]))
+            spacing = line_spacing(boxes[first[:sample_glyphs]])
+        tol, word_gap = spacing
+
+        order, rows = layout.reading_order(boxes, tol)
+        breaks = layout.word_breaks(boxes, order, rows, word_gap)
+        center = boxes[:, 1] + boxes[:, 3] / 2.0
+        done = np.zeros(len(pending), dtype=bool)
+        for idx, brk in zip(layout.split_rows(order, rows), layout.split_rows(breaks, rows)):
+            # a later glyph has its center below own_end and would start a new row
+            if not last and center[idx].max() + tol >= own_end:
+                break
+            done[idx] = True
+            items = [pending[i] for i in idx]
+            chars = [it[1] for it in items]
+            out = {"line": ''.join((' ' + c) if b else c for c, b in zip(chars, brk)),
+                   "row": ''.join(chars), "chars": chars,
+                   "boxes": [it[0] for it in items], "scores": [it[2] for it in items]}
+            if engine.top_k > 1:
+                out["candidates"] = [it[3][0] for it in items]
+                out["candidate_scores"] = [it[3][1] for it in items]
+            yield out
+        pending = [p for p, d in zip(pending, done) if not d]
@@ -0,0 +1,334 @@
+import hashlib
+
+import numpy as np
+
+
+def _normalize_rows(mat):
+    """L2-normalize each row of ``mat``; rows with zero norm stay zero.
+
+    A zero row gives a score of 0, which is what cv2.matchTemplate returns
+    for a flat (blank) ROI or template with the *_NORMED methods.
+    """
+    norms = np.sqrt(np.einsum('ij,ij->i', mat, mat))[:, None]
+    out = np.zeros_like(mat)
+    np.divide(mat, norms, out=out, where=norms > 0)
+    return out
+
+
+def _score_features(flat):
+    """Build the [CCOEFF | CCORR] feature vectors for flattened images.
+
+    flat: float32 array (N, D). Returns float32 array (N, 2*D) where the first
+    half is the mean-centered, L2-normalized vector (TM_CCOEFF_NORMED) and the
+    second half is the L2-normalized raw vector (TM_CCORR_NORMED).
+    """
+    centered = flat - flat.mean(axis=1, keepdims=True)
+    return np.hstack([_normalize_rows(centered), _normalize_rows(flat)])
+
+
+# น้ำหนักของ descriptor แบบหยาบ (อัตราส่วนกว้าง/สูง, ความหนาแน่นหมึก) เทียบกับภาพย่อ 8x8
+ASPECT_WEIGHT = 4.0
+DENSITY_WEIGHT = 4.0
+PROJECTION_SIZE = 8
+# ชื่อเทมเพลตหลายแบบของตัวอักษรเดียวกัน: "<char>@<variant>" (เช่น A@BKANT-30)
+VARIANT_SEP = "@"
+# glyphs scored together by match_pruned() against the union of their candidates
+PRUNE_CHUNK = 256
+# with fewer templates the exhaustive matmul is cheaper than the descriptors
+PRUNE_MIN_TEMPLATES = 512
+
+
+def glyph_descriptors(images):
+    """Cheap descriptors for a batch of normalized glyphs, shape (N, 66).
+
+    [aspect, ink density, 8x8 downsampled image]. The aspect is w / (w + h)
+    of the tight ink box, so it stays in [0, 1]; the first two entries are
+    weighted so that they count as much as a good part of the projection.
+    """
+    images = np.asarray(images)
+    n, height, width = images.shape
+    ink = (images > 127).astype(np.float32)
+
+    row_sums = ink.sum(axis=2)
+    rows_any = row_sums > 0
+    cols_any = ink.any(axis=1)
+    # tight box size from first/last row and column containing ink
+    h = height - rows_any.argmax(axis=1) - rows_any[:, ::-1].argmax(axis=1)
+    w = width - cols_any.argmax(axis=1) - cols_any[:, ::-1].argmax(axis=1)
+    empty = ~rows_any.any(axis=1)
+    h[empty] = 0
+    w[empty] = 0
+    aspect = np.divide(w, w + h, out=np.zeros(n), where=(w + h) > 0)
+    density = row_sums.sum(axis=1) / (height * width)
+
+    # block averages (the image padded up to a multiple of PROJECTION_SIZE)
+    # as two small matrix products: rows (P, H) @ ink (N, H, W) @ cols (W, P)
+    bh = -(-height // PROJECTION_SIZE)
+    bw = -(-width // PROJECTION_SIZE)
+    row_blocks = (np.arange(height) // bh == np.arange(PROJECTION_SIZE)[:, None])
+    col_blocks = (np.arange(width) // bw == np.arange(PROJECTION_SIZE)[:, None])
+    proj = (row_blocks.astype(np.float32) @ ink @ col_blocks.T.astype(np.float32)) / (bh * bw)
+
+    return np.hstack([(aspect * ASPECT_WEIGHT)[:, None],
+                      (density * DENSITY_WEIGHT)[:, None],
+                      proj.reshape(n, -1)]).astype(np.float32)
+
+
+class CandidateIndex:
+    """Precomputed descriptor matrix of the templates for top-K search.
+
+    A query is a (N, 66) descriptor batch; distances to all templates are
+    one small matrix multiply (66 values per template instead of the 2*H*W
+    used for full scoring), followed by an argpartition.
+    """
+
+    def __init__(self, descriptors):
+        self.descriptors = np.ascontiguousarray(descriptors, dtype=np.float32)
+        self.sq = np.einsum('ij,ij->i', self.descriptors, self.descriptors)
+
+    def search(self, queries, k):
+        """Indices (N, k) of the k nearest templates, in no particular order."""
+        m = len(self.descriptors)
+        k = min(k, m)
+        if k == m:
+            return np.broadcast_to(np.arange(m), (len(queries), m))
+        # squared distance up to |query|^2, which is the same for every template
+        dist = self.sq[None, :] - 2.0 * (np.asarray(queries, dtype=np.float32) @ self.descriptors.T)
+        return np.argpartition(dist, k - 1, axis=1)[:, :k]
+
+
+def template_char(name):
+    """Char recognized by a template named ``name``.
+
+    Several templates of one char (fonts, sizes) are named ``<char>@<variant>``
+    and chars that cannot be file names are written as ``uXXXX`` (their code
+    point), see Create_template.py.
+    """
+    base = name.split(VARIANT_SEP, 1)[0]
+    if len(base) == 5 and base[0] == 'u':
+        try:
+            return chr(int(base[1:], 16))
+        except ValueError:
+            pass
+    return base
+
+
+class TemplateBank:
+    """All templates stacked into one pre-normalized matrix.
+
+    When the ROI and the template have the same size, cv2.matchTemplate
+    returns a single value, so TM_CCOEFF_NORMED and TM_CCORR_NORMED reduce to
+    dot products of normalized vectors. Both are precomputed here so a batch
+    of N ROIs is scored against all templates with one matrix multiply:
+
+        scores = features(rois) @ weights      # (N, 2D) @ (2D, M)
+
+    and the combined score is the average of the two methods, the same as
+    the original per-template loop. OpenCV returns a TM_CCOEFF_NORMED of 1
+    for a flat (constant) template whatever the ROI is; that case is kept
+    as a constant per-template ``bias``.
+    """
+
+    def __init__(self, chars, images):
+        self.chars = list(chars)
+        images = np.asarray(images, dtype=np.uint8)
+        if images.ndim != 3 or len(images) != len(self.chars):
+            raise ValueError("images must have shape (len(chars), H, W)")
+
+        self.images = images
+        self.height, self.width = images.shape[1:]
+
+        # explicit feature size: reshape(0, -1) fails for an empty bank
+        flat = images.reshape(len(self.chars), int(np.prod(images.shape[1:]))).astype(np.float32)
+        # 0.5 folds the average of the two scores into the weights
+        self.weights = np.ascontiguousarray(_score_features(flat).T * 0.5)
+        is_flat = flat.max(axis=1) == flat.min(axis=1)
+        self.bias = np.where(is_flat, 0.5, 0.0).astype(np.float32)
+
+    @classmethod
+    def from_dict(cls, templates):
+        """Build a bank from a {char: template_img} dict (e.g. load_templates)."""
+        chars = list(templates.keys())
+        if not chars:
+            return cls([], np.zeros((0, 1, 1), dtype=np.uint8))
+        return cls(chars, np.stack([templates[c] for c in chars]))
+
+    @classmethod
+    def from_compiled(cls, chars, images, weights, bias):
+        """Wrap arrays that were already computed (e.g. memory-mapped from a
+        compiled bank file) without copying or recomputing them."""
+        bank = cls.__new__(cls)
+        bank.chars = list(chars)
+        bank.images = images
+        bank.height, bank.width = images.shape[1:]
+        bank.weights = weights
+        bank.bias = bias
+        return bank
+
+    @property
+    def fingerprint(self):
+        """Hash of the chars and template images; identifies this bank in caches."""
+        if getattr(self, "_fingerprint", None) is None:
+            h = hashlib.sha256("\0".join(self.chars).encode())
+            h.update(np.ascontiguousarray(self.images).tobytes())
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    @property
+    def index(self):
+        """CandidateIndex over the template descriptors (built on first use)."""
+        if getattr(self, "_index", None) is None:
+            self._index = CandidateIndex(glyph_descriptors(self.images))
+        return self._index
+
+    @property
+    def weight_rows(self):
+        """weights as a row-major (M, 2D) copy, for gathering candidate rows."""
+        if getattr(self, "_weight_rows", None) is None:
+            self._weight_rows = np.ascontiguousarray(self.weights.T)
+        return self._weight_rows
+
+    @property
+    def labels(self):
+        """Recognized char of every template (``chars`` are the template names)."""
+        if getattr(self, "_labels", None) is None:
+            self._labels = [template_char(name) for name in self.chars]
+        return self._labels
+
+    @property
+    def label_ids(self):
+        """(distinct chars, (M,) index of every template's char in them)."""
+        if getattr(self, "_label_ids", None) is None:
+            distinct = list(dict.fromkeys(self.labels))
+            position = {char: i for i, char in enumerate(distinct)}
+            self._label_ids = distinct, np.array([position[c] for c in self.labels],
+                                                 dtype=np.int64)
+        return self._label_ids
+
+    def top_chars(self, scores, k, columns=None):
+        """The k best distinct chars per row of ``scores``.
+
+        ``scores`` is (N, M) over all templates, or (N, C) over the template
+        indices ``columns`` (N, C) when only candidates were scored. A char
+        with several templates counts with its best one. Returns (top_chars,
+        top_scores): N lists of k chars and an (N, k) array, best first.
+        """
+        distinct, ids = self.label_ids
+        n = len(scores)
+        if columns is None and len(distinct) == len(self.chars):
+            per_char = scores  # one template per char: nothing to reduce
+        else:
+            per_char = np.full((n, len(distinct)), -np.inf, dtype=np.float32)
+            cols = ids[columns] if columns is not None else np.broadcast_to(ids, scores.shape)
+            np.maximum.at(per_char, (np.arange(n)[:, None], cols), scores)
+
+        k = min(k, len(distinct))
+        part = np.argpartition(-per_char, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(per_char, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind='stable')
+        top = np.take_along_axis(part, order, axis=1)
+        top_scores = np.take_along_axis(part_scores, order, axis=1)
+        if columns is not None:
+            # chars that had no candidate template stay -inf; drop them
+            top_scores = np.where(np.isfinite(top_scores), top_scores, -1.0)
+        return [[distinct[j] for j in row] for row in top.tolist()], top_scores
+
+    def __len__(self):
+        return len(self.chars)
+
+    def __getitem__(self, char):
+        """Template image by name, or the first template of a char."""
+        if char in self.chars:
+            return self.images[self.chars.index(char)]
+        return self.images[self.labels.index(char)]
+
+    def _as_batch(self, rois):
+        rois = np.asarray(rois)
+        if rois.ndim == 2:
+            rois = rois[None]
+        if len(self.chars) == 0:
+            return rois  # empty bank: every ROI gets '?' whatever its size
+        if rois.shape[1:] != (self.height, self.width):
+            raise ValueError(f"ROI size {rois.shape[1:]} does not match "
+                             f"template size {(self.height, self.width)}")
+        return rois
+
+    def scores(self, rois):
+        """Combined (CCOEFF + CCORR) / 2 scores, shape (N, len(bank))."""
+        rois = self._as_batch(rois)
+        flat = rois.reshape(len(rois), -1).astype(np.float32)
+        return _score_features(flat) @ self.weights + self.bias
+
+    def match(self, rois, top_k=1):
+        """Best template for each ROI.
+
+        Returns (chars, scores): a list of N chars and a float array of N
+        scores. Ties go to the first template, like the original loop. If the
+        bank is empty every ROI gets '?' with score -1. With ``top_k > 1``
+        the k best distinct chars are returned too, from the same score
+        matrix: (chars, scores, top_chars, top_scores), see top_chars().
+        """
+        rois = self._as_batch(rois) if len(rois) else np.zeros((0, 1, 1))
+        if len(rois) == 0 or len(self.chars) == 0:
+            empty = ['?'] * len(rois), np.full(len(rois), -1.0, dtype=np.float32)
+            if top_k > 1:
+                return empty + ([['?'] for _ in range(len(rois))],
+                                np.full((len(rois), 1), -1.0, dtype=np.float32))
+            return empty
+
+        scores = self.scores(rois)
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(rois)), best]
+        chars = [self.labels[i] for i in best]
+        if top_k > 1:
+            return (chars, best_scores) + self.top_chars(scores, top_k)
+        return chars, best_scores
+
+    def candidates(self, rois, k):
+        """Indices (N, k) of the k templates nearest to each ROI by descriptor."""
+        return self.index.search(glyph_descriptors(self._as_batch(rois)), k)
+
+    def match_pruned(self, rois, k, stats=None, top_k=1):
+        """Two-stage match: pick k candidates by descriptor, then fully score
+        only those. Same return value as match() (top chars are taken from
+        the k candidates).
+
+        Glyphs are scored ``chunk`` at a time with one matrix multiply
+        against the union of their candidates; glyphs with the same
+        candidates are put next to each other first, so the union stays
+        small and memory is (chunk x union) instead of (N x k x 2D). Banks
+        of fewer than PRUNE_MIN_TEMPLATES templates get match() (exact, and
+        cheaper than computing the descriptors).
+
+        If ``stats`` (a dict) is given, the exhaustive match is also run and
+        stats["glyphs"] / stats["mismatches"] are incremented, so the cost of
+        pruning can be measured on real data before turning the check off.
+        """
+        rois = self._as_batch(rois) if len(rois) else np.zeros((0, 1, 1))
+        if len(rois) == 0 or len(self.chars) < PRUNE_MIN_TEMPLATES:
+            return self.match(rois, top_k)
+
+        # sorted, so argmax keeps ties on the first template like match()
+        cand = np.sort(self.candidates(rois, k), axis=1)
+        feats = _score_features(rois.reshape(len(rois), -1).astype(np.float32))
+        scores = np.empty(cand.shape, dtype=np.float32)
+        order = np.lexsort(cand.T[::-1])
+        for start in range(0, len(order), PRUNE_CHUNK):
+            idx = order[start:start + PRUNE_CHUNK]
+            union, pos = np.unique(cand[idx], return_inverse=True)
+            chunk = feats[idx] @ self.weights[:, union] + self.bias[union]
+            scores[idx] = np.take_along_axis(chunk, pos.reshape(len(idx), -1), axis=1)
+        pos = scores.argmax(axis=1)
+        rows = np.arange(len(rois))
+        best = cand[rows, pos]
+        best_scores = scores[rows, pos]
+        chars = [self.labels[i] for i in best]
+
+        if stats is not None:
+            full_chars, _ = self.match(rois)
+            stats["glyphs"] = stats.get("glyphs", 0) + len(rois)
+            stats["mismatches"] = stats.get("mismatches", 0) + int(
+                sum(a != b for a, b in zip(chars, full_chars)))
+        if top_k > 1:
+            return (chars, best_scores) + self.top_chars(scores, top_k, cand)
+        return chars, best_scores
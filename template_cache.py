@@ -0,0 +1,146 @@
+import argparse
+import hashlib
+import os
+import zipfile
+
+import numpy as np
+
+from ocr_engine import (TEMPLATE_EXTS, TEMPLATE_WIDTH, TEMPLATE_HEIGHT,
+                        default_template_dirs, load_templates)
+from template_bank import TemplateBank
+
+# เปลี่ยนค่านี้เมื่อรูปแบบไฟล์หรือวิธี preprocess เทมเพลตเปลี่ยน เพื่อบังคับให้ compile ใหม่
+CACHE_VERSION = 1
+# source_hash ของ bank ที่สร้างจากฟอนต์โดยตรง (Create_template.py --bank) ไม่มีโฟลเดอร์ให้ตรวจ
+STANDALONE_PREFIX = "fonts:"
+
+
+def sources_hash(template_dirs, width=TEMPLATE_WIDTH, height=TEMPLATE_HEIGHT):
+    """SHA-256 over every template file (folder, name and bytes) plus the size.
+
+    Only the raw bytes are read, nothing is decoded, so checking whether a
+    compiled bank is still valid is much cheaper than rebuilding it.
+    """
+    if isinstance(template_dirs, str):
+        template_dirs = [template_dirs]
+
+    h = hashlib.sha256(f"v{CACHE_VERSION}:{width}x{height}".encode())
+    for tdir in template_dirs:
+        h.update(b"\0dir:" + os.path.basename(os.path.normpath(tdir)).encode())
+        if not os.path.isdir(tdir):
+            continue
+        for fname in sorted(os.listdir(tdir)):
+            if os.path.splitext(fname)[1].lower() not in TEMPLATE_EXTS:
+                continue
+            with open(os.path.join(tdir, fname), 'rb') as f:
+                data = f.read()
+            h.update(b"\0file:" + fname.encode() + b"\0" + hashlib.sha256(data).digest())
+    return h.hexdigest()
+
+
+def save_compiled(bank, path, source_hash, **extra):
+    """Write a TemplateBank to an uncompressed .npz (written atomically).
+
+    Members are stored (not deflated), so load_compiled() can memory-map
+    them straight out of the archive. ``extra`` arrays are stored as well.
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f,
+                 chars=np.array(bank.chars, dtype=str),
+                 images=bank.images,
+                 weights=bank.weights,
+                 bias=bank.bias,
+                 source_hash=np.array(source_hash),
+                 **extra)
+    # os.replace is atomic, so concurrent workers never see a half-written file
+    os.replace(tmp_path, path)
+
+
+def _mmap_npz(path):
+    """Memory-map every member of an uncompressed .npz, read-only.
+
+    np.load(mmap_mode='r') only memory-maps plain .npy files, so the member
+    offsets inside the zip are located here and each array is opened with
+    np.memmap. Every process mapping the same file shares its pages.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {info.filename} is compressed")
+            # local file header: 30 fixed bytes + file name + extra field
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype='<u2')
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            key = os.path.splitext(info.filename)[0]
+            if dtype.hasobject:
+                raise ValueError(f"{path}: member {key} holds Python objects")
+            if len(shape) == 0 or int(np.prod(shape)) == 0:
+                # scalars / empty arrays are tiny, just read them
+                count = int(np.prod(shape))
+                data = np.frombuffer(f.read(count * dtype.itemsize), dtype=dtype)
+                arrays[key] = data.reshape(shape)
+                continue
+            arrays[key] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(),
+                                    shape=shape, order='F' if fortran else 'C')
+    return arrays
+
+
+def load_compiled(path):
+    """Load a compiled bank. Returns (TemplateBank, source_hash)."""
+    arrays = _mmap_npz(path)
+    bank = TemplateBank.from_compiled(
+        [str(c) for c in arrays["chars"]], arrays["images"],
+        arrays["weights"], arrays["bias"])
+    return bank, str(arrays["source_hash"][()])
+
+
+def load_or_compile(template_dirs, path, width=TEMPLATE_WIDTH, height=TEMPLATE_HEIGHT,
+                    verbose=False):
+    """Return the bank from ``path``, rebuilding it first if any template changed.
+
+    Banks rendered straight from fonts (Create_template.py --bank) have no
+    template folders behind them and are always used as they are.
+    """
+    current = sources_hash(template_dirs, width, height)
+    if os.path.exists(path):
+        try:
+            bank, cached = load_compiled(path)
+            if cached == current or cached.startswith(STANDALONE_PREFIX):
+                return bank
+            if verbose:
+                print(f"เทมเพลตมีการเปลี่ยนแปลง กำลัง compile ใหม่: {path}")
+        except Exception as e:
+            print(f"คำเตือน: ไม่สามารถอ่านไฟล์ {path} ({e}) กำลัง compile ใหม่")
+
+    bank = TemplateBank.from_dict(load_templates(template_dirs, width, height, verbose=verbose))
+    save_compiled(bank, path, current)
+    if verbose:
+        print(f"บันทึกเทมเพลตที่ compile แล้ว {len(bank)} ตัว ลงไฟล์ {path}")
+    # reload so the returned bank is backed by the shared memory map
+    return load_compiled(path)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile template folders into a single memory-mappable .npz bank")
+    parser.add_argument('output', help='Path of the compiled bank, e.g. templates.npz')
+    parser.add_argument('--template-dir', '-t', action='append', dest='template_dirs',
+                        help='Template folder (repeatable, default: the bundled folders)')
+    parser.add_argument('--width', type=int, default=TEMPLATE_WIDTH)
+    parser.add_argument('--height', type=int, default=TEMPLATE_HEIGHT)
+    args = parser.parse_args()
+
+    template_dirs = args.template_dirs or default_template_dirs()
+    load_or_compile(template_dirs, args.output, args.width, args.height, verbose=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,335 @@
+import json
+import os
+import shutil
+import threading
+import urllib.error
+import urllib.request
+
+import cv2
+import numpy as np
+import pytest
+
+from binarization import PageStats, binarize
+from layout import as_boxes
+from ocr_engine import OCREngine, default_template_dirs
+from ocr_server import OCRService, make_server
+from result_table import concat_tables, load_table, page_table, save_table
+from segmentation import merge_vertical_parts
+from streaming import recognize_stream
+from template_bank import PRUNE_MIN_TEMPLATES, TemplateBank
+from template_cache import load_or_compile
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sentence_image.png")
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return OCREngine()
+
+
+@pytest.fixture(scope="module")
+def sample_gray():
+    return cv2.imread(SAMPLE, cv2.IMREAD_GRAYSCALE)
+
+
+@pytest.fixture(scope="module")
+def sample_glyphs(engine, sample_gray):
+    """(thresh, boxes, rois) of the sample page."""
+    thresh = engine.binarize(sample_gray)
+    boxes = engine.segment(thresh)
+    return thresh, boxes, engine.normalize(thresh, boxes)
+
+
+def reference_roi(roi, width, height):
+    """Per-glyph normalization of the original script (np.where crop, resize, pad)."""
+    ys, xs = np.where(roi > 0)
+    if len(xs):
+        roi = roi[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    h, w = roi.shape
+    scale = min(width / w, height / h)
+    new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+    canvas = np.zeros((height, width), dtype=np.uint8)
+    x_off, y_off = (width - new_w) // 2, (height - new_h) // 2
+    canvas[y_off:y_off+new_h, x_off:x_off+new_w] = cv2.resize(
+        roi, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    return canvas
+
+
+def test_batched_normalization_matches_per_glyph(engine, sample_glyphs):
+    thresh, boxes, rois = sample_glyphs
+    assert len(boxes) > 50
+    for (x, y, w, h), roi in zip(boxes.tolist(), rois):
+        np.testing.assert_array_equal(
+            roi, reference_roi(thresh[y:y+h, x:x+w], engine.width, engine.height))
+
+
+def test_bank_scores_match_cv2(engine, sample_glyphs):
+    rois = sample_glyphs[2]
+    bank = engine.bank
+    expected = np.empty((len(rois), len(bank)), dtype=np.float32)
+    for i, roi in enumerate(rois):
+        for j, template in enumerate(bank.images):
+            ccoeff = cv2.matchTemplate(roi, template, cv2.TM_CCOEFF_NORMED).max()
+            ccorr = cv2.matchTemplate(roi, template, cv2.TM_CCORR_NORMED).max()
+            expected[i, j] = (ccoeff + ccorr) / 2.0
+    np.testing.assert_allclose(bank.scores(rois), expected, atol=1e-4)
+
+
+@pytest.fixture(scope="module")
+def shifted_bank(engine):
+    """558 templates: every bundled template shifted by up to 1 px, so the
+    bank is large enough for pruning (PRUNE_MIN_TEMPLATES) to be used."""
+    chars, images = [], []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            for char, image in zip(engine.bank.chars, engine.bank.images):
+                chars.append(f"{char}@s{dy + 1}{dx + 1}")
+                images.append(np.roll(image, (dy, dx), axis=(0, 1)))
+    bank = TemplateBank(chars, np.stack(images))
+    assert len(bank) >= PRUNE_MIN_TEMPLATES
+    return bank
+
+
+def test_pruned_match_against_exhaustive(shifted_bank, sample_glyphs):
+    rois = sample_glyphs[2]
+    chars, scores = shifted_bank.match(rois)
+
+    # every template a candidate: the exhaustive answer
+    pruned_chars, pruned_scores = shifted_bank.match_pruned(rois, len(shifted_bank))
+    assert pruned_chars == chars
+    np.testing.assert_allclose(pruned_scores, scores, atol=1e-5)
+
+    # k=16 (the documented starting point) keeps every answer on the sample
+    pruned_chars, pruned_scores = shifted_bank.match_pruned(rois, 16)
+    assert pruned_chars == chars
+    np.testing.assert_allclose(pruned_scores, scores, atol=1e-5)
+
+    # a small k trades a few answers for speed, never with a better score
+    stats = {}
+    pruned_chars, pruned_scores = shifted_bank.match_pruned(rois, 4, stats=stats)
+    assert stats["glyphs"] == len(rois)
+    assert 0 < stats["mismatches"] <= 0.05 * len(rois)
+    assert (pruned_scores <= scores + 1e-5).all()
+
+
+def test_empty_bank():
+    bank = TemplateBank.from_dict({})
+    assert len(bank) == 0
+    chars, scores = bank.match(np.zeros((3, 30, 30), dtype=np.uint8))
+    assert chars == ['?'] * 3
+    assert scores.tolist() == [-1.0] * 3
+    chars, scores = bank.match(np.zeros((0, 30, 30), dtype=np.uint8))
+    assert chars == [] and len(scores) == 0
+
+
+def test_stream_matches_whole_page(engine, sample_gray):
+    whole = engine.recognize(sample_gray)
+    for band_height in (40, 200, 2048):
+        lines = list(recognize_stream(engine, sample_gray, band_height, overlap=64))
+        assert [line["row"] for line in lines] == whole["rows"]
+        assert [line["line"] for line in lines] == whole["lines"]
+
+
+class _ReadLog:
+    """Page stand-in that records which rows are read."""
+
+    def __init__(self, page):
+        self.page = page
+        self.reads = []
+
+    def __len__(self):
+        return len(self.page)
+
+    def __getitem__(self, rows):
+        self.reads.append(rows.stop)
+        return self.page[rows]
+
+
+def test_stream_yields_lines_before_the_last_band(engine, sample_gray):
+    page = _ReadLog(sample_gray)
+    stream = recognize_stream(engine, page, band_height=40, overlap=64, sample_glyphs=20)
+    first = next(stream)
+    reads_at_first_line = len(page.reads)
+    lines = [first] + list(stream)
+    assert reads_at_first_line < len(page.reads)
+    # the rows do not depend on how the page is cut into bands
+    wide = recognize_stream(engine, sample_gray, band_height=2048, overlap=64, sample_glyphs=20)
+    assert [line["line"] for line in wide] == [line["line"] for line in lines]
+
+
+def test_glyph_cache_file_keyed_by_match_settings(tmp_path, sample_gray):
+    path = str(tmp_path / "glyphs.npz")
+    pruned = OCREngine(prune_k=1, glyph_cache_size=1000, glyph_cache_file=path)
+    pruned.recognize(sample_gray)
+    pruned.close()
+    exhaustive = OCREngine(glyph_cache_size=1000, glyph_cache_file=path)
+    exhaustive.recognize(sample_gray)
+    assert exhaustive.glyph_cache.stats["hits"] == 0
+
+
+def test_merge_parts_keeps_sample_text(sample_gray):
+    plain = OCREngine(segmenter="components").recognize(sample_gray)
+    merged = OCREngine(segmenter="components", merge_parts=True).recognize(sample_gray)
+    assert merged["lines"] == plain["lines"]
+
+
+def test_merge_vertical_parts_joins_dot_to_its_glyph():
+    boxes = as_boxes([(10, 20, 4, 16), (10, 14, 4, 4),   # i: dot 2 px above the stem
+                      (30, 20, 4, 16), (30, 8, 4, 4),    # dot too far above
+                      (50, 30, 4, 7), (50, 22, 4, 6)])   # mark taller than its glyph
+    areas = boxes[:, 2] * boxes[:, 3]
+    centroids = boxes[:, :2] + boxes[:, 2:] / 2.0
+    merged, merged_areas, _ = merge_vertical_parts(boxes, areas, centroids, 4, 6)
+    assert sorted(merged.tolist()) == sorted([[10, 14, 4, 22]] + boxes[2:].tolist())
+    assert merged_areas.sum() == areas.sum()
+
+
+def test_split_touching_pair(engine, sample_gray):
+    thresh = engine.binarize(sample_gray)
+    result = engine.recognize_binary(thresh)
+    crops = {}
+    for char, (x, y, w, h) in zip(result["chars"], result["boxes"]):
+        crops.setdefault(char, thresh[y:y + h, x:x + w])
+
+    # glyphs of the sample on a common baseline; the "u" overlaps the "c" by 1 px
+    text = "Cat cu mow"
+    height = max(crop.shape[0] for crop in crops.values())
+    page = np.zeros((height + 40, 40 + 30 * len(text)), dtype=np.uint8)
+    x = 20
+    for i, char in enumerate(text):
+        if char == " ":
+            x += 20
+            continue
+        if i == text.index("u"):
+            x -= 9
+        h, w = crops[char].shape
+        band = page[20 + height - h:20 + height, x:x + w]
+        np.maximum(band, crops[char], out=band)
+        x += w + 8
+
+    assert OCREngine().recognize_binary(page)["lines"] == ["Cat mow"]
+    splitter = OCREngine(split_touching=True)
+    assert splitter.recognize_binary(page)["lines"] == [text]
+    # only the pair is cut; the wide but single m and w stay whole
+    assert splitter.split_stats["split"] == 1
+    assert splitter.split_stats["pieces"] == 1
+    assert splitter.split_stats["wide"] > 1
+
+
+def test_compiled_cache_is_mapped_and_rebuilt_on_change(tmp_path):
+    digits = str(tmp_path / "Digits_templates")
+    shutil.copytree(default_template_dirs()[0], digits)
+    path = str(tmp_path / "templates.npz")
+
+    bank = load_or_compile([digits], path)
+    assert isinstance(bank.images, np.memmap)
+    stamp = os.stat(path).st_mtime_ns
+    assert load_or_compile([digits], path).chars == bank.chars
+    assert os.stat(path).st_mtime_ns == stamp  # unchanged templates: no rebuild
+
+    shutil.copyfile(os.path.join(digits, "7.png"), os.path.join(digits, "1.png"))
+    rebuilt = load_or_compile([digits], path)
+    np.testing.assert_array_equal(rebuilt["1"], rebuilt["7"])
+    assert not np.array_equal(rebuilt["1"], bank["1"])
+
+
+def test_top_k_table_shape(tmp_path, sample_gray):
+    result = OCREngine(top_k=3).recognize(sample_gray)
+    table = page_table(result)
+    n = len(result["chars"]) + len(result["rejected"])
+    assert table["cand_chars"].shape == table["cand_scores"].shape == (n, 3)
+    assert table["cand_chars"][:, 0].tolist() == table["char"].tolist()
+    np.testing.assert_allclose(table["cand_scores"][:, 0], table["score"], atol=1e-5)
+    assert (np.diff(table["cand_scores"], axis=1) <= 0).all()
+
+    # a top-1 page is padded to K columns when the tables are stacked
+    plain = page_table(OCREngine().recognize(sample_gray), page=1)
+    both = concat_tables([table, plain])
+    assert both["cand_chars"].shape == (n + len(plain["char"]), 3)
+    assert (both["cand_scores"][n:, 1:] == -1.0).all()
+
+    path = str(tmp_path / "table.npz")
+    save_table(path, both, ["a.png", "b.png"])
+    loaded, pages = load_table(path)
+    assert pages == ["a.png", "b.png"]
+    assert loaded["cand_chars"].shape == both["cand_chars"].shape
+
+
+def test_page_stats_reused_across_passes(sample_gray):
+    stats = PageStats(sample_gray)
+    tiled = OCREngine(binarizer="tiled").binarize(sample_gray, stats)
+    hist = stats.tile_histograms
+    again = OCREngine(binarizer="tiled").binarize(sample_gray, stats)
+    assert stats.tile_histograms is hist
+    np.testing.assert_array_equal(again, tiled)
+    np.testing.assert_array_equal(tiled, binarize(sample_gray, "tiled"))
+
+
+@pytest.fixture
+def server_factory(engine):
+    """Start OCR services on ephemeral localhost ports; they are shut down
+    after the test. Returns (service, base_url)."""
+    running = []
+
+    def start(**kwargs):
+        service = OCRService(engine, **kwargs)
+        server = make_server(service, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        running.append((server, service, thread))
+        return service, "http://%s:%d" % server.server_address[:2]
+
+    yield start
+    for server, service, thread in running:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        service.pool.shutdown(wait=True)
+        service.batcher.close()
+
+
+def post(url, data):
+    """(status, decoded JSON) of a POST, also for error statuses."""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=60) as r:
+            return r.status, json.load(r)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_server_answers_on_localhost(engine, server_factory):
+    _, url = server_factory(workers=2, queue_size=2)
+    with open(SAMPLE, 'rb') as f:
+        status, result = post(url + "/ocr", f.read())
+    assert status == 200
+    assert result["lines"] == engine.recognize(cv2.imread(SAMPLE))["lines"]
+
+    status, result = post(url + "/ocr", b"this is not an image")
+    assert status == 400 and "error" in result
+
+
+def test_server_rejects_when_queue_is_full(server_factory):
+    service, url = server_factory(workers=1, queue_size=0)
+    started, release = threading.Event(), threading.Event()
+    process = service._process
+
+    def blocked(data):
+        started.set()
+        release.wait(60)
+        return process(data)
+
+    service._process = blocked
+    with open(SAMPLE, 'rb') as f:
+        image = f.read()
+    first = {}
+    thread = threading.Thread(target=lambda: first.update(status=post(url + "/ocr", image)[0]))
+    thread.start()
+    try:
+        # the first request holds the only slot until it is released
+        assert started.wait(30)
+        status, result = post(url + "/ocr", image)
+        assert status == 503 and "error" in result
+    finally:
+        release.set()
+        thread.join()
+    assert first["status"] == 200